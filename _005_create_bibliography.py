@@ -2,26 +2,93 @@
 # Author:   Michael E. Rose <michael.ernst.rose@gmail.com>
 """Combines all relevant data from Scopus records."""
 
+from os import makedirs
+from os.path import exists
+
+import numpy as np
 import pandas as pd
-from numpy import cumsum
 from pybliometrics.scopus import AbstractRetrieval, CitationOverview, ScopusSearch
+from tqdm import tqdm
 
 SOURCE_FILE = "./001_journal_IDs/Scopus.csv"
 TARGET_FILE = "./005_bibliometric_information/Scopus.csv"
+CITATION_FOLDER = "./005_bibliometric_information/citations/"
 
 YEARS = (1997, 2011)
+CITATION_YEARS = (1950, 2020)  # Citing years kept in the citation store
+CHUNK_SIZE = 1000  # Number of EIDs fetched before appending to the store
 TOP_JOURNALS = ('JF', 'RFS', 'JFE')
 DOCTYPES = ("ar", "re", "cp", "ip", "no", "sh")
 
 
-def parse_abstract(pub, refresh=350):
-    """Extract bibliometric information and add yearly citations."""
-    # Basic bibliometric information
+def append_citations(records):
+    """Append yearly citations in dict `records` (EID: (publication year,
+    {year: citations})) to the citation store.
+    """
+    makedirs(CITATION_FOLDER, exist_ok=True)
+    first, last = CITATION_YEARS
+    M = np.full((len(records), last-first+1), -1, dtype="int32")
+    for i, (_, cites) in enumerate(records.values()):
+        for year, count in cites.items():
+            if first <= year <= last:
+                M[i, year-first] = count
+    index_file = CITATION_FOLDER + "index.csv"
+    n = read_citations()[0].shape[0]
+    with open(CITATION_FOLDER + "counts.dat", "ab") as outf:
+        # Discard rows of an interrupted previous append
+        outf.truncate(n*M.shape[1]*M.itemsize)
+        M.tofile(outf)
+    index = pd.DataFrame({"eid": list(records),
+                          "pubyear": [p for p, _ in records.values()]})
+    index.to_csv(index_file, mode="a", header=not exists(index_file),
+                 index=False)
+
+
+def citation_matrix(eids, store=None):
+    """Return EID-by-year array of yearly citations in CITATION_YEARS, with
+    missing values for years not covered and EIDs not in the store.
+    """
+    index, _, M = store or read_citations()
+    rows = index.get_indexer(eids)
+    found = rows > -1
+    out = np.full((len(rows), M.shape[1]), np.nan)
+    out[found] = M[rows[found]]
+    out[out < 0] = np.nan
+    return out
+
+
+def cumulative_citations(eids, lags, store=None):
+    """Return EID-by-lag array of citations cumulated from the publication
+    year until `lags` years later, with missing values for years not covered.
+    """
+    store = store or read_citations()
+    index, pubyears, _ = store
+    X = citation_matrix(eids, store)
+    rows = index.get_indexer(eids)
+    start = np.full(len(rows), CITATION_YEARS[1]+1)
+    start[rows > -1] = pubyears[rows[rows > -1]]
+    cols = (start - CITATION_YEARS[0])[:, None] + np.asarray(lags)[None, :]
+    valid = (cols >= 0) & (cols < X.shape[1])
+    cols = np.clip(cols, 0, X.shape[1]-1)
+    rows = np.arange(X.shape[0])[:, None]
+    out = np.nancumsum(X, axis=1)[rows, cols]
+    out[~valid | np.isnan(X[rows, cols])] = np.nan
+    return out
+
+
+def get_yearly_citations(eid, pubyear, refresh=False):
+    """Return dict of yearly citations."""
+    co = CitationOverview(eid, start=pubyear, end=CITATION_YEARS[1],
+                          refresh=refresh)
+    return {int(y): int(c) for y, c in co.cc}
+
+
+def parse_abstract(pub):
+    """Extract bibliometric information."""
     s = pd.Series()
     s['title'] = pub.title
     s['eid'] = pub.eid
-    pubyear = int(pub.coverDate.split("-")[0])
-    s['year'] = str(pubyear)
+    s['year'] = pub.coverDate.split("-")[0]
     try:
         pages = pub.pageRange.split("-")
     except AttributeError:
@@ -30,15 +97,27 @@ def parse_abstract(pub, refresh=350):
     s['num_pages'] = int(pages[1]) - int(pages[0])
     s['num_auth'] = pub.author_count
     s['authors'] = pub.author_ids
-    # Yearly cumulated citations
-    co = CitationOverview(pub.eid, start=pubyear, end=2020, refresh=refresh)
-    s['total_citations'] = sum([int(t[1]) for t in co.cc])
-    lags = [f"citcount_{y-pubyear}" for y, _ in co.cc]
-    citations = cumsum([int(t[1]) for t in co.cc])
-    s = s.append(pd.Series(citations, index=lags))
     return s
 
 
+def read_citations():
+    """Return EID index, publication years and memory-mapped EID-by-year
+    array of yearly citations in CITATION_YEARS (-1: not covered) of
+    the citation store.
+    """
+    n_years = CITATION_YEARS[1] - CITATION_YEARS[0] + 1
+    index_file = CITATION_FOLDER + "index.csv"
+    if not exists(index_file):
+        empty = np.empty((0, n_years), dtype="int32")
+        return pd.Index([], dtype=object), np.array([], dtype="int32"), empty
+    dtypes = {"eid": str, "pubyear": "int32"}
+    index = pd.read_csv(index_file, dtype=dtypes, encoding="utf8")
+    shape = (index.shape[0], n_years)
+    M = np.memmap(CITATION_FOLDER + "counts.dat", dtype="int32", mode="r",
+                  shape=shape)
+    return pd.Index(index["eid"]), index["pubyear"].values, M
+
+
 def standardize(ds):
     """Remove interpunctuation and whitespaces from a string."""
     from string import punctuation
@@ -51,6 +130,29 @@ def standardize(ds):
     return ss.translate(str.maketrans({k: "" for k in punctuation + '®™–'}))
 
 
+def update_citations(eids, pubyears, refresh=False):
+    """Fetch yearly citations of EIDs missing from the citation store,
+    append them in chunks and return the updated store.
+    """
+    known = read_citations()[0]
+    todo = pd.Series(np.asarray(pubyears, dtype="int32"), index=eids)
+    todo = todo[~todo.index.duplicated() & ~todo.index.isin(known)]
+    print(f">>> Searching yearly citation counts for {todo.shape[0]:,} articles")
+    records = {}
+    for eid, pubyear in tqdm(todo.items(), total=todo.shape[0]):
+        try:
+            records[eid] = (pubyear, get_yearly_citations(eid, pubyear, refresh))
+        except Exception as e:
+            print("\n", e, eid)
+            continue
+        if len(records) == CHUNK_SIZE:
+            append_citations(records)
+            records = {}
+    if records:
+        append_citations(records)
+    return read_citations()
+
+
 def main():
     # Read in
     journals = pd.read_csv(SOURCE_FILE, index_col=0, encoding="utf8")
@@ -73,6 +175,16 @@ def main():
 
     # Turn to DataFrame
     df = pd.DataFrame.from_records(d)
+
+    # Yearly cumulated citations
+    store = update_citations(df['eid'], df['year'].astype(int), refresh=350)
+    lags = np.arange(CITATION_YEARS[1] - YEARS[0] + 1)
+    cites = pd.DataFrame(cumulative_citations(df['eid'], lags, store),
+                         columns=[f"citcount_{lag}" for lag in lags])
+    cites = cites.dropna(how="all", axis=1)
+    yearly = pd.DataFrame(citation_matrix(df['eid'], store))
+    df['total_citations'] = yearly.sum(axis=1, min_count=1)
+    df = pd.concat([df, cites], axis=1)
     print(">>> Correcting some titles")
     repl = {"&amp;": "&", "<sup>": "", "</sup>": "", "<inf>": "", "</inf>": ""}
     for old, new in repl.items():
@@ -1,30 +1,24 @@
 #!/usr/bin/env python3
 # Author:   Michael E. Rose <michael.ernst.rose@gmail.com>
-"""Quantifies informal collaboration behavior on a yearly basis."""
+"""Quantifies informal collaboration behavior on a yearly basis.
+
+Also provides the paper-by-person incidence matrices by role from which
+informal collaboration pairs and yearly networks are derived.
+"""
 
-from collections import defaultdict
 from json import loads
 from urllib.request import urlopen
 
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix, diags
 
 ACK_FILE = "https://raw.githubusercontent.com/Michael-E-Rose/CoFE/master/acks_min.json"
 TARGET_FOLDER = "./115_collaboration_counts/"
+PERSON_FILE = TARGET_FOLDER + "person_year.csv"
 
-
-def add_subdict(d, persons, key, value):
-    """Add nested subdict to person entry in a dict if it exists,
-    otherwise create.
-    """
-    for p in persons:
-        try:
-            try:
-                d[p][key] += value
-            except KeyError:
-                d[p].update({key: value})
-        except KeyError:
-            d[p] = {key: value}
-    return d
+WIDE_CSV = True  # Also write counts as wide CSV (person-variable by year)
+ROLES = ("auth", "com", "dis", "phd")  # Roles of persons on a paper
 
 
 def count(data, key):
@@ -35,47 +29,124 @@ def count(data, key):
         return data[key]
 
 
+def incidence_layers(papers, roles=ROLES, ids=None):
+    """Return person IDs and dict of sparse paper-by-person matrices for
+    the columns `roles` (lists of persons) of DataFrame `papers`.
+    """
+    if ids is None:
+        persons = set()
+        for role in roles:
+            persons.update(p for entry in papers[role] for p in entry)
+        ids = pd.Index(sorted(persons))
+    return ids, {role: incidence_matrix(papers[role], ids)[1]
+                 for role in roles}
+
+
+def incidence_matrix(persons, ids=None):
+    """Return person IDs and sparse paper-by-person matrix counting how
+    often each person is listed in a Series of lists.
+    """
+    flat = [p for entry in persons for p in entry]
+    if ids is None:
+        ids = pd.Index(sorted(set(flat)))
+    rows = np.repeat(np.arange(len(persons)), [len(e) for e in persons])
+    M = csr_matrix((np.ones(len(flat)), (rows, ids.get_indexer(flat))),
+                   shape=(len(persons), len(ids)))
+    return ids, M
+
+
+def link_matrix(B_from, B_to, weights=None):
+    """Return sparse person-by-person matrix summing paper `weights`
+    (default: 1) over all papers, given the incidence matrices of the
+    linking persons and of the linked persons.
+    """
+    if weights is not None:
+        B_to = diags(weights) @ B_to
+    return (B_from.T @ B_to).tocsr()
+
+
 def main():
     acks = loads(urlopen(ACK_FILE).read().decode("utf-8"))['data']
 
-    person = defaultdict(dict)
-    for item in acks:
-        pub_year = item['year']
-        d = person[pub_year]
-        # Persons
-        auths = [a.get('scopus_id', a['label']) for a in item['authors']]
-        dis = [c.get('scopus_id', c['label']) for c in item.get('dis', [])]
-        coms = [c.get('scopus_id', c['label']) for c in item.get('com', [])]
-        coms.extend(dis)
-        coms.extend([p.get('scopus_id', p['label']) for x in item['authors']
-                     for p in x.get('phd', [])])
-        # Meta information
-        has_ack = (len(coms) > 0 or 'sem' in item or 'con' in item)
-        if not has_ack:
-            continue
-        # Numbers
-        counts = {'num_auth': len(auths), 'num_com': len(coms),
-                  'num_dis': len(dis), 'num_con': count(item.copy(), 'con'),
-                  'num_sem': count(item.copy(), 'sem'), 'num_paper': 1}
-        for col in ['com', 'dis', 'con', 'sem']:
-            key = f"num_{col}_n"
-            counts[key] = counts['num_' + col]/counts['num_auth']
+    # Papers with acknowledgements
+    papers = parse_acks(acks)
+    papers['coms'] = papers['com'] + papers['dis'] + papers['phd']
+    has_ack = (papers['coms'].str.len() > 0) | papers['presented']
+    papers = papers[has_ack].reset_index(drop=True)
+    ids, B = incidence_layers(papers, ("auth", "coms", "dis"))
+
+    # Numbers
+    ones = np.ones(papers.shape[0])
+    num_auth = papers['auth'].str.len().values
+    counts = {'num_auth': num_auth, 'num_com': papers['coms'].str.len().values,
+              'num_dis': papers['dis'].str.len().values,
+              'num_con': papers['con'].values.astype(float),
+              'num_sem': papers['sem'].values.astype(float),
+              'num_paper': ones}
+    for col in ['com', 'dis', 'con', 'sem']:
+        key = f"num_{col}_n"
+        counts[key] = counts['num_' + col]/num_auth
+
+    # Person information
+    years = papers['year'].values
+    df = pd.concat([
         # Author information: informal collaboration
-        for label, val in counts.items():
-            d = add_subdict(d, auths, label, val)
+        person_year_sums(B['auth'], ids, years, counts),
         # Commenter information: given comments
-        d = add_subdict(d, coms, 'com_given', 1)
+        person_year_sums(B['coms'], ids, years, {'com_given': ones}),
         # Discussant information: given discussions
-        d = add_subdict(d, dis, 'dis_given', 1)
+        person_year_sums(B['dis'], ids, years, {'dis_given': ones})])
+    df = (df.groupby(["node", "year", "variable"])["value"].sum()
+            .unstack("variable")
+            .reset_index())
+    df.columns.name = None
+    df.to_csv(PERSON_FILE, index=False)
+    if WIDE_CSV:
+        wide = (df.melt(id_vars=["node", "year"], var_name="variable")
+                  .set_index(["node", "variable", "year"])["value"]
+                  .unstack("year")
+                  .reset_index())
+        wide.to_csv(TARGET_FOLDER + "person.csv", index=False)
 
-    # Person information
-    df = pd.DataFrame(columns=['index', 'variable'])
-    for year in sorted(person.keys()):
-        new = pd.DataFrame.from_dict(person[year]).T.reset_index()
-        new = new.melt(id_vars='index', value_name=year)
-        df = df.merge(new, 'outer', on=['index', 'variable'])
-    df = df.sort_values(['index', 'variable']).rename(columns={'index': 'node'})
-    df.to_csv(TARGET_FOLDER + "person.csv", index=False)
+
+def parse_acks(records):
+    """Return DataFrame with one row per paper from acknowledgement records,
+    with lists of persons (Scopus ID, alternatively name) by role.
+    """
+    def get_persons(item):
+        """Extract Scopus ID (alternatively: name) from a list of dicts."""
+        return [c.get('scopus_id', c['label']) for c in item]
+
+    papers = []
+    for item in records:
+        papers.append({
+            'year': item['year'], 'journal': item['journal'],
+            'auth': get_persons(item['authors']),
+            'com': get_persons(item.get('com', [])),
+            'dis': get_persons(item.get('dis', [])),
+            'phd': [p.get('scopus_id', p['label']) for x in item['authors']
+                    for p in x.get('phd', [])],
+            'con': count(item, 'con'), 'sem': count(item, 'sem'),
+            'presented': 'sem' in item or 'con' in item})
+    return pd.DataFrame(papers)
+
+
+def person_year_sums(B, ids, years, values):
+    """Return long DataFrame of paper `values` (dict of arrays) for each
+    listing of a person in incidence matrix B, by person and year.
+    """
+    B = B.tocoo()
+    return pd.concat([
+        pd.DataFrame({"node": ids[B.col], "year": years[B.row],
+                      "variable": key, "value": B.data*vals[B.row]})
+        for key, vals in values.items()])
+
+
+def read_collaboration_counts():
+    """Read yearly counts of informal collaboration by person, with one
+    column per variable.
+    """
+    return pd.read_csv(PERSON_FILE, dtype={"node": str}, encoding="utf8")
 
 
 if __name__ == '__main__':
@@ -2,11 +2,17 @@
 # Author:   Michael E. Rose <michael.ernst.rose@gmail.com>
 """Indicates pairs of formal and informal collaboration by year."""
 
-from itertools import product
-
+import numpy as np
 import pandas as pd
 
+from _115_count_collaboration import incidence_layers, link_matrix
+
+EDITOR_FILE = "./075_editor_tenures/list.csv"
 TARGET_FILE = "./116_informal_collaboration_pairs/pairs.csv"
+PAIR_FILE = "./116_informal_collaboration_pairs/pairs.npz"
+
+WRITE_CSV = True  # Also write pairs as CSV
+EDITOR_LOOKBACK = 1  # Years before publication whose editors are excluded
 
 
 def read_ack_file():
@@ -26,10 +32,6 @@ def read_ack_file():
         return [p.get('scopus_id', p['label']) for x in item
                 for p in x.get('phd', [])]
 
-    def filter_editors(item):
-        """Remove commenters that are editors."""
-        return [c for c in item['com'] if c not in item['editors']]
-
     def flatten(item):
         """Collapse lists from DataFrame columns."""
         return [e for p in item for e in p]
@@ -37,7 +39,6 @@ def read_ack_file():
     # Read from web
     ACK_FILE = "https://raw.githubusercontent.com/Michael-E-Rose/CoFE/"\
                "master/acks_min.json"
-    EDITOR_FILE = "../InfCor_data/020_editor_tenures/list.csv"
     data = loads(urlopen(ACK_FILE).read().decode("utf-8"))['data']
     acks = pd.DataFrame(data)
     acks['phd'] = acks['authors'].apply(get_phd)
@@ -45,39 +46,93 @@ def read_ack_file():
         acks[col] = acks[col].apply(get_persons)
     acks['auth'] = acks['authors'].apply(get_persons)
     # Remove editors of this and previous year
-    eds = pd.read_csv(EDITOR_FILE).dropna(subset=['scopus_id'])
-    eds = eds[eds['managing_editor'] == 1]
-    eds['scopus_id'] = eds['scopus_id'].astype(int).astype(str) + " "
-    grouped = eds.groupby(['journal', 'year'])['scopus_id'].sum().reset_index()
-    grouped['editors'] = grouped['scopus_id'].str.split()
-    grouped = grouped[['journal', 'year', 'editors']]
-    acks = acks.merge(grouped, "left", on=['journal', 'year'])
-    grouped['year'] = grouped['year'] + 1
-    acks = acks.merge(grouped, "left", on=['journal', 'year'],
-                      suffixes=['_this', '_prev'])
-    acks['editors'] = acks[['editors_this', 'editors_prev']].apply(flatten, axis=1)
-    acks['com'] = acks.apply(filter_editors, axis=1)
+    acks['com'] = remove_editors(acks['com'], acks['journal'], acks['year'],
+                                 read_editors())
     acks['coms'] = acks[['com', 'phd', 'dis']].apply(flatten, axis=1)
-    drops = ['authors', 'com', 'phd', 'dis', 'editors_this', 'editors_prev', 'editors']
+    drops = ['authors', 'com', 'phd', 'dis']
     return acks.drop(drops, axis=1)
 
 
+def list_pairs(acks):
+    """Return IDs of persons and sorted array of unique integer-coded
+    (author, commenter, year) triples on acknowledged papers.
+    """
+    ids, B = incidence_layers(acks, ("auth", "coms"))
+    years = acks["year"].values.astype(int)
+    out = []
+    for year in np.unique(years):
+        mask = years == year
+        L = link_matrix(B["auth"][mask], B["coms"][mask]).tocoo()
+        out.append(np.column_stack([L.row, L.col, np.full(L.nnz, year)]))
+    out = np.vstack(out) if out else np.empty((0, 3), dtype=int)
+    used = np.unique(out[:, :2])
+    out[:, :2] = np.searchsorted(used, out[:, :2])
+    return ids[used], out[np.lexsort((out[:, 1], out[:, 0], out[:, 2]))]
+
+
 def main():
     # Informal collaboration
     acks = read_ack_file()
 
-    # Get combinations year-wise
-    authcom_collabs = []
-    for year in acks['year'].unique():
-        subset = acks[acks['year'] == year]
-        for auth, com in zip(subset['auth'], subset['coms']):
-            new_links = product(auth, com)
-            authcom_collabs.extend([(x[0], x[1], year) for x in new_links])
+    # Get combinations
+    ids, pairs = list_pairs(acks)
 
     # Write out
-    out = pd.DataFrame(authcom_collabs, columns=['author', 'commenter', 'year'])
-    out = out.sort_values(['year', 'author', 'commenter']).drop_duplicates()
-    out.to_csv(TARGET_FILE, index=False)
+    write_pairs(ids, pairs)
+    if WRITE_CSV:
+        read_pairs().to_csv(TARGET_FILE, index=False)
+
+
+def read_editors(lookback=EDITOR_LOOKBACK):
+    """Return dict mapping journal and year to the set of Scopus IDs of
+    managing editors of that journal in that year or in the `lookback`
+    years before.
+    """
+    eds = pd.read_csv(EDITOR_FILE).dropna(subset=['scopus_id'])
+    eds = eds[eds['managing_editor'] == 1]
+    eds['scopus_id'] = eds['scopus_id'].astype(int).astype(str)
+    eds = pd.concat([eds.assign(year=eds['year'] + lag)
+                     for lag in range(lookback+1)])
+    grouped = eds.groupby(['journal', 'year'])['scopus_id']
+    return {key: frozenset(ids) for key, ids in grouped}
+
+
+def read_pairs(years=None):
+    """Return DataFrame of author-commenter pairs, possibly only for
+    publication years in the range `years` (first and last year).
+    """
+    with np.load(PAIR_FILE) as data:
+        first, last = 0, len(data["year"])
+        if years:
+            first, last = data["offsets"][np.searchsorted(
+                data["years"], (years[0], years[1]+1))]
+        ids = data["ids"]
+        out = pd.DataFrame({"author": ids[data["author"][first:last]],
+                            "commenter": ids[data["commenter"][first:last]],
+                            "year": data["year"][first:last]})
+    return out
+
+
+def remove_editors(persons, journals, years, editors):
+    """Remove editors (as indexed by `read_editors()`) from lists of persons
+    on papers published in given journals and years.
+    """
+    empty = frozenset()
+    return [[p for p in entry if p not in editors.get((j, y), empty)]
+            for entry, j, y in zip(persons, journals, years)]
+
+
+def write_pairs(ids, pairs):
+    """Write IDs of persons and integer-coded pairs sorted by year as
+    compressed binary file, with the offset of each year's first pair.
+    """
+    years = np.unique(pairs[:, 2])
+    offsets = np.append(np.searchsorted(pairs[:, 2], years), len(pairs))
+    np.savez_compressed(PAIR_FILE, ids=np.asarray(ids, dtype=str),
+                        author=pairs[:, 0].astype("int32"),
+                        commenter=pairs[:, 1].astype("int32"),
+                        year=pairs[:, 2].astype("uint16"),
+                        years=years, offsets=offsets)
 
 
 if __name__ == '__main__':
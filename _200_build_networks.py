@@ -4,42 +4,196 @@
 informal collaboration only.
 """
 
-from collections import Counter, defaultdict
-from itertools import combinations, product
-from json import loads
+from hashlib import md5
+from json import dump, dumps, load, loads
+from multiprocessing import Pool
+from os import makedirs
 from urllib.request import urlopen
 
 import networkx as nx
-import pandas as pd
+import numpy as np
 from num2words import num2words
+from scipy.sparse import triu
+
+from _115_count_collaboration import incidence_layers, link_matrix, parse_acks
+from _116_list_informal_pairs import read_editors, remove_editors
 
 ACK_FILE = "https://raw.githubusercontent.com/Michael-E-Rose/CoFE/"\
            "master/acks_min.json"
-EDITOR_FILE = "./075_editor_tenures/list.csv"
 TARGET_FOLDER = "./200_yearly_networks/"
+SWEEP_FOLDER = "./200_yearly_networks/sweep/"
+SNAPSHOT_FILE = "./200_yearly_networks/snapshot.json"
+DIRTY_FILE = "./200_yearly_networks/dirty_years.txt"
 OUTPUT_FOLDER = "./990_output/"
 
 SPAN = 3  # number of years for each network
 MAX_YEAR = 2011
+ROLES = ("com", "dis", "phd")  # Roles of persons counted as commenters
+SWEEP = False  # Also build networks of all CONFIGURATIONS
+N_PROCESSES = None  # Number of worker processes for sweep (None: all CPUs)
+INCREMENTAL = False  # Rebuild only networks with new or changed papers
+CONFIGURATIONS = {  # Deviations from default parameters of build_networks()
+    "span2": {"span": 2},
+    "span5": {"span": 5},
+    "with_editors": {"exclude_editors": False},
+    "no_phd": {"roles": ("com", "dis")},
+    "dis_only": {"roles": ("dis",)}}
+
+
+def build_networks(papers, editors, target, stats_folder, span=SPAN,
+                   max_year=MAX_YEAR, exclude_editors=True, roles=ROLES,
+                   changed=None):
+    """Build yearly networks from parsed papers, each spanning `span` years,
+    with persons of `roles` as commenters, and write them to folder
+    `target` and their statistics to folder `stats_folder`.
+
+    With `changed` set, only networks whose window contains one of these
+    publication years are rebuilt.  Return set of rebuilt network years.
+    """
+    papers = papers.copy()
+    # Remove editors of this and previous year
+    if exclude_editors:
+        for role in roles:
+            papers[role] = remove_editors(papers[role], papers['journal'],
+                                          papers['year'], editors)
+    papers['coms'] = [[p for entry in entries for p in entry]
+                      for entries in zip(*(papers[role] for role in roles))]
+    ids, B = incidence_layers(papers, ("auth", "coms"))
+    B_auth, B_coms = B['auth'], B['coms'].sign()
+    has_ack = (B_coms.getnnz(axis=1) > 0) | papers['presented'].values
+    stats = {"N_of_articles": len(papers), "N_of_articles_with": has_ack.sum()}
+
+    years = papers['year'].values
+    journals = papers['journal'].values
+    num_auth = B_auth.sum(axis=1).A1
+    built = set()
+    for year in range(1997+span-1, max_year+1):
+        if changed is not None and not changed & set(range(year-span+1, year+1)):
+            continue
+        # Papers of this and the previous span-1 years
+        mask = (years > year-span) & (years <= year)
+        if not mask.any():
+            continue
+        built.add(year)
+        stats[f"N_of_articles_{year_name(year, -2)}"] = mask.sum()
+        if has_ack[mask].any():
+            stats[f"N_of_articles_with_{year_name(year, -2)}"] = has_ack[mask].sum()
+        A = make_network(B_auth[mask], B_auth[mask], ids, journals[mask])
+        A.graph["name"] = "auth"
+        C = make_network(B_coms[mask], B_auth[mask], ids, journals[mask],
+                         1/num_auth[mask], directed=True)
+        C.graph["name"] = "com"
+        for label, G in [('auth', A), ('com', C)]:
+            assert(len(list(nx.selfloop_edges(G))) == 0)
+            nx.write_gexf(G, f"{target}/{year}_{label}.gexf")
 
-
-def add_attribute(network, edges, val, attr='weight'):
-    """Creates, appends or increases attribute of edges"""
-    for entry in edges:
-        d = network.edges[entry[0], entry[1]]
-        try:
-            if isinstance(d[attr], str):
-                d[attr] += ";" + val  # append
-            else:
-                d[attr] += val  # increase
-        except KeyError:
-            d[attr] = val  # create
-
-
-def write_stats(stat_dct):
+    # Persons
+    is_scopus = ids.str.isdigit()
+    authors = B_auth.getnnz(axis=0) > 0
+    comments = B_coms.sum(axis=0).A1
+    commenters = comments > 0
+    stats.update(
+        {"N_of_authors_all": authors.sum(),
+         "N_of_authors_scopus": (authors & is_scopus).sum(),
+         "N_of_commenters_all": commenters.sum(),
+         "N_of_commenters_scopus": (commenters & is_scopus).sum(),
+         "N_of_comments_all": comments.sum(),
+         "N_of_comments_scopus": comments[is_scopus].sum(),
+         "N_of_persons_all": (authors | commenters).sum(),
+         "N_of_persons_scopus": ((authors | commenters) & is_scopus).sum()})
+    write_stats(stats, stats_folder)
+    return built
+
+
+def changed_years(records, fname=SNAPSHOT_FILE):
+    """Return publication years of papers in acknowledgement `records`
+    that are new, changed or removed compared to the snapshot of the
+    previous run (None without snapshot).
+    """
+    try:
+        with open(fname) as inf:
+            previous = load(inf)
+    except FileNotFoundError:
+        return None
+    current = snapshot(records)
+    new = current.keys() - previous.keys()
+    removed = previous.keys() - current.keys()
+    changed = {key for key in current.keys() & previous.keys()
+               if current[key] != previous[key]}
+    print(f">>> {len(new):,} new, {len(removed):,} removed and "
+          f"{len(changed):,} changed acknowledgement records")
+    return ({current[key][0] for key in new | changed} |
+            {previous[key][0] for key in removed | changed})
+
+
+def make_network(B_from, B_to, ids, journals, weights=None, directed=False):
+    """Return network with links from persons in incidence matrix B_from
+    to persons in B_to on the same paper, weighted by the sum of paper
+    `weights` (default: 1), and with the papers' journals as attribute.
+    """
+    W = link_matrix(B_from, B_to, weights)
+    if not directed:
+        W = triu(W, k=1)
+    W = W.tocoo()
+    # Journal of each paper, repeated for each of its links
+    labels = [[] for _ in range(W.nnz)]
+    for journal in np.unique(journals) if W.nnz else []:
+        mask = journals == journal
+        J = link_matrix(B_from[mask], B_to[mask])
+        n_links = np.asarray(J[W.row, W.col]).ravel().astype(int)
+        for i in np.flatnonzero(n_links):
+            labels[i].extend([journal]*n_links[i])
+    G = nx.DiGraph() if directed else nx.Graph()
+    G.add_nodes_from(ids[B_from.getnnz(axis=0) > 0])
+    G.add_edges_from((ids[u], ids[v], {'weight': float(w),
+                                       'journal': ";".join(j)})
+                     for u, v, w, j in zip(W.row, W.col, W.data, labels))
+    return G
+
+
+def read_dirty_years(fname=DIRTY_FILE):
+    """Return set of network years rebuilt since later stages last
+    processed them (None if unknown, i.e. all years).
+    """
+    try:
+        with open(fname) as inf:
+            return {int(line) for line in inf if line.strip()}
+    except FileNotFoundError:
+        return None
+
+
+def snapshot(records):
+    """Return dict mapping each paper's journal and title to its year and
+    a digest of its acknowledgement record.
+    """
+    out = {}
+    for item in records:
+        key = f"{item['journal']}: {item.get('title', '')}"
+        digest = md5(dumps(item, sort_keys=True).encode("utf8")).hexdigest()
+        out[key] = [item['year'], digest]
+    return out
+
+
+def sweep(args):
+    """Build networks of one named configuration in its own folder."""
+    name, papers, editors = args
+    folder = f"{SWEEP_FOLDER}{name}/"
+    makedirs(folder + "Statistics/", exist_ok=True)
+    build_networks(papers, editors, folder, folder + "Statistics/",
+                   **CONFIGURATIONS[name])
+    return name
+
+
+def write_dirty_years(years, fname=DIRTY_FILE):
+    """Write network years to be processed by later stages."""
+    with open(fname, "w") as out:
+        out.write("".join(f"{year}\n" for year in sorted(years)))
+
+
+def write_stats(stat_dct, folder=OUTPUT_FOLDER + "Statistics/"):
     """Write out textfiles as "filename: content" pair."""
     for key, cont in stat_dct.items():
-        fname = f"{OUTPUT_FOLDER}/Statistics/{key}.txt"
+        fname = f"{folder}{key}.txt"
         with open(fname, "w") as out:
             out.write(f"{int(cont):,}")
 
@@ -51,84 +205,28 @@ def year_name(year, last_digits=None):
 
 def main():
     # READ IN
-    eds = pd.read_csv(EDITOR_FILE).dropna(subset=['scopus_id'])
-    eds = eds[eds['managing_editor'] == 1]
-    eds['scopus_id'] = eds['scopus_id'].astype(int).astype(str)
     acks = loads(urlopen(ACK_FILE).read().decode("utf-8"))['data']
-
-    stats = {"N_of_articles": len(acks), "N_of_articles_with": 0}
+    papers = parse_acks(acks)
+    editors = read_editors()
 
     # GENERATE NETWORKS
-    art_counter = []  # Count papers by year
-    with_counter = []  # Count papers with acknowledgements by year
-    all_authors = set()  # Count unique authors
-    all_commenters = []  # Count unique and weighted number of commenters
-    A = defaultdict(lambda: nx.Graph(name="auth"))
-    C = defaultdict(lambda: nx.DiGraph(name="com"))
-    for item in acks:
-        pub_year = item['year']
-        journal = item['journal']
-        # Authors
-        auths = [a.get('scopus_id', a['label']) for a in item['authors']]
-        all_authors.update(auths)
-        # Commenters
-        coms = [c.get('scopus_id', c['label']) for c in item.get('com', [])]
-        coms.extend([c.get('scopus_id', c['label']) for c in item.get('dis', [])])
-        coms.extend([p.get('scopus_id', p['label']) for x in item['authors']
-                     for p in x.get('phd', [])])
-        # Remove editors of this and previous year
-        eds_range = range(pub_year-1, pub_year+1)
-        mask = (eds['year'].isin(eds_range)) & (eds['journal'] == item['journal'])
-        cur_editors = set(eds[mask]['scopus_id'])
-        coms = set(coms) - cur_editors
-        has_ack = (coms or 'sem' in item or 'con' in item)
-        if has_ack:
-            stats["N_of_articles_with"] += 1
-        all_commenters.extend([c for c in coms])
-        # Add weighted links to this and the next LAG networks
-        for cur_year in range(pub_year, pub_year+SPAN):
-            if cur_year < 1997+SPAN-1 or cur_year > MAX_YEAR:
-                continue
-            art_counter.append(cur_year)
-            auth_links = list(combinations(auths, 2))
-            com_links = list(product(coms, auths))
-            if has_ack:
-                with_counter.append(cur_year)
-            # Author network
-            A[cur_year].add_nodes_from(auths)
-            A[cur_year].add_edges_from(auth_links)
-            add_attribute(A[cur_year], auth_links, 1.0)
-            add_attribute(A[cur_year], auth_links, journal, 'journal')
-            # Commenter network
-            C[cur_year].add_nodes_from(coms)
-            C[cur_year].add_edges_from(com_links)
-            add_attribute(C[cur_year], com_links, 1/len(auths))
-            add_attribute(C[cur_year], com_links, journal, 'journal')
-
-    # WRITE OUT
-    for label, d in [('auth', A), ('com', C)]:
-        for year, G in d.items():
-            assert(len(list(nx.selfloop_edges(G))) == 0)
-            ouf = f"{TARGET_FOLDER}/{year}_{label}.gexf"
-            nx.write_gexf(G, ouf)
-
-    # SAVE STATISTICS
-    stats.update({f"N_of_articles_{year_name(k, -2)}": v for k, v
-                  in Counter(art_counter).items()})
-    stats.update({f"N_of_articles_with_{year_name(k, -2)}": v for k, v
-                  in Counter(with_counter).items()})
-    all_persons = all_authors.union(all_commenters)
-    all_comments = Counter(all_commenters)
-    stats.update(
-        {"N_of_authors_all": len(all_authors),
-         "N_of_authors_scopus": sum([a.isdigit() for a in all_authors]),
-         "N_of_commenters_all": len(set(all_commenters)),
-         "N_of_commenters_scopus": sum([c.isdigit() for c in set(all_commenters)]),
-         "N_of_comments_all": sum(all_comments.values()),
-         "N_of_comments_scopus": sum([v for k, v in all_comments.items()if k.isdigit()]),
-         "N_of_persons_all": len(all_persons),
-         "N_of_persons_scopus": sum([p.isdigit() for p in all_persons])})
-    write_stats(stats)
+    dirty = read_dirty_years()
+    changed = None
+    if INCREMENTAL and dirty is not None:
+        changed = changed_years(acks)
+    built = build_networks(papers, editors, TARGET_FOLDER,
+                           OUTPUT_FOLDER + "Statistics/", changed=changed)
+    with open(SNAPSHOT_FILE, "w") as out:
+        dump(snapshot(acks), out)
+    print(f">>> Rebuilt networks of {len(built):,} years")
+    if changed is not None:
+        built |= dirty
+    write_dirty_years(built)
+    if SWEEP:
+        tasks = [(name, papers, editors) for name in CONFIGURATIONS]
+        with Pool(N_PROCESSES) as pool:
+            for name in pool.imap_unordered(sweep, tasks):
+                print(f">>> Configuration {name} done")
 
 
 if __name__ == '__main__':
@@ -9,15 +9,77 @@ from operator import itemgetter
 from os.path import basename, splitext
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+from scipy.sparse import coo_matrix
 from scipy.stats import spearmanr
 
-from _200_build_networks import year_name, write_stats
+from _200_build_networks import read_dirty_years, write_dirty_years,\
+    write_stats, year_name
 
 NETWORK_FOLDER = "./200_yearly_networks/"
 TARGET_FOLDER = "./205_centralities/"
 OUTPUT_FOLDER = "./990_output/"
 
+APPROXIMATE = False  # Estimate distances via HyperANF instead of exact BFS
+PRECISION = 10  # log2 of the number of HyperLogLog registers per node
+CHUNK = 2**14  # Number of edges whose counters are merged at once
+WIDE_CSV = True  # Also write centralities as wide CSV (node-measure by year)
+INCREMENTAL = False  # Recompute only years whose networks were rebuilt
+
+
+def adjacency(H, weight=None):
+    """Return symmetric sparse adjacency matrix of a network in the order
+    of its nodes.
+    """
+    pos = {n: i for i, n in enumerate(H.nodes())}
+    rows, cols, vals = [], [], []
+    for u, v, d in H.edges(data=True):
+        rows.append(pos[u])
+        cols.append(pos[v])
+        vals.append(d.get(weight, 1.0) if weight else 1.0)
+    n = len(pos)
+    A = coo_matrix((vals, (rows, cols)), shape=(n, n)).tocsr()
+    A = A.maximum(A.T)  # Undirected view
+    A.setdiag(0)
+    A.eliminate_zeros()
+    return A
+
+
+def clustering(H, weight=None):
+    """Return Series with local clustering coefficients and the
+    transitivity of a network, based on sparse triangle counting.
+
+    Weighted clustering uses the geometric mean of normalized edge weights,
+    as in networkx.
+    """
+    A = adjacency(H, weight)
+    degree = np.asarray((A > 0).sum(axis=1)).ravel().astype(float)
+    if weight and A.nnz:
+        A = A/A.max()
+        A.data = np.cbrt(A.data)
+    triangles = np.asarray((A @ A).multiply(A).sum(axis=1)).ravel()
+    triads = degree*(degree - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        local = np.where(triads > 0, triangles/triads, 0.0)
+    transitivity = triangles.sum()/triads.sum() if triads.sum() else 0.0
+    return pd.Series(local, index=list(H.nodes())), transitivity
+
+
+def centrality_frame(label, measures=None, years=None, prefix=False):
+    """Return DataFrame with one row per node-year and one column per
+    centrality measure from the memory-mapped panel, dropping node-years
+    without any information.
+    """
+    nodes, years, views = read_centrality_panel(label, measures, years)
+    df = pd.DataFrame({"node": np.repeat(nodes, len(years)),
+                       "year": np.tile(years, len(nodes))})
+    for measure, view in views.items():
+        name = f"{label}_{measure}" if prefix else measure
+        df[name] = view.ravel()
+    df = df.dropna(how="all", subset=df.columns[2:])
+    return df.reset_index(drop=True)
+
 
 def compute_centralities(H, G):
     """Return DataFrame with node-wise network measures."""
@@ -38,6 +100,42 @@ def compute_centralities(H, G):
     return df
 
 
+def distance_statistics(nf, quantile=0.9):
+    """Return average path length and (interpolated) effective diameter
+    from a neighborhood function.
+    """
+    if nf.iloc[-1] == nf.iloc[0]:  # No pairs at positive distance
+        return 0.0, 0.0
+    pairs = nf.diff().iloc[1:].clip(lower=0)
+    avg_path = (pairs * pairs.index).sum()/pairs.sum()
+    share = (nf - nf.iloc[0])/(nf.iloc[-1] - nf.iloc[0])
+    t = share[share >= quantile].index[0]
+    prev = share[t-1]
+    eff_diam = t - 1 + (quantile - prev)/(share[t] - prev)
+    return avg_path, eff_diam
+
+
+def edge_array(G):
+    """Return list of nodes and integer array of undirected edges."""
+    nodes = list(G.nodes())
+    pos = {n: i for i, n in enumerate(nodes)}
+    edges = np.array([(pos[u], pos[v]) for u, v in G.edges()], dtype="int64")
+    return nodes, edges.reshape(-1, 2)
+
+
+def exact_neighborhood_function(G):
+    """Return Series with the exact number of node pairs within distance t
+    of each other, based on breadth-first search from every node.
+    """
+    counts = np.zeros(1, dtype="int64")
+    for _, lengths in nx.all_pairs_shortest_path_length(G):
+        found = np.bincount(list(lengths.values()))
+        if len(found) > len(counts):
+            counts = np.pad(counts, (0, len(found) - len(counts)))
+        counts[:len(found)] += found
+    return pd.Series(counts.cumsum())
+
+
 def giant(H):
     """Return giant component of a network."""
     try:
@@ -47,6 +145,81 @@ def giant(H):
     return H.subgraph(sorted(components, key=len, reverse=True)[0])
 
 
+def read_centrality_panel(label, measures=None, years=None):
+    """Return node IDs, years and dict of zero-copy node-by-year views on
+    the memory-mapped centrality panel for selected measures and years.
+    """
+    with np.load(f"{TARGET_FOLDER}yearly_centr_{label}.npz") as index:
+        nodes = index["nodes"]
+        all_years = index["years"]
+        all_measures = list(index["measures"])
+    fname = f"{TARGET_FOLDER}yearly_centr_{label}_panel.npy"
+    panel = np.load(fname, mmap_mode="r")
+    if years is None:
+        years = (all_years[0], all_years[-1])
+    cols = slice(*np.searchsorted(all_years, [years[0], years[-1]+1]))
+    measures = measures or all_measures
+    views = {m: panel[:, cols, all_measures.index(m)] for m in measures}
+    return nodes, all_years[cols], views
+
+
+def read_previous(label, years):
+    """Return long records, global statistics and neighborhood functions
+    of network type `label` written by the previous run, except for
+    `years`.
+    """
+    with np.load(f"{TARGET_FOLDER}yearly_centr_{label}.npz") as data:
+        records = pd.DataFrame({
+            "node": data["nodes"][data["node"]],
+            "centrality": data["measures"][data["measure"]],
+            "value": data["value"], "year": data["year"].astype(int)})
+    records = records[~records["year"].isin(years)]
+    df = pd.read_csv(f"{TARGET_FOLDER}global_{label}.csv", index_col=0)
+    df.index = df.index.astype(str).rename(None)
+    df = df[~df.index.astype(int).isin(years)].T
+    nf = {}
+    if APPROXIMATE:
+        fname = f"{OUTPUT_FOLDER}Tables/neighborhood_function_{label}.csv"
+        old = pd.read_csv(fname, index_col=0)
+        nf = {y: old[y].dropna() for y in old if int(y) not in years}
+    return records, df, nf
+
+
+def write_centralities(records, label, wide=WIDE_CSV):
+    """Concatenate long records of all years once and write them as typed
+    binary file and as memory-mapped node-by-year-by-measure panel,
+    optionally also as wide CSV file with one column per year.
+    """
+    df = pd.concat(records, ignore_index=True)
+    node_codes, nodes = pd.factorize(df["node"], sort=True)
+    measure_codes, measures = pd.factorize(df["centrality"], sort=True)
+    year_codes, years = pd.factorize(df["year"], sort=True)
+    fname = f"{TARGET_FOLDER}yearly_centr_{label}.npz"
+    np.savez_compressed(fname, nodes=np.asarray(nodes, dtype=str),
+                        measures=np.asarray(measures, dtype=str),
+                        years=np.asarray(years, dtype="uint16"),
+                        node=node_codes.astype("int32"),
+                        year=df["year"].values.astype("uint16"),
+                        measure=measure_codes.astype("uint8"),
+                        value=df["value"].values.astype("float32"))
+    fname = f"{TARGET_FOLDER}yearly_centr_{label}_panel.npy"
+    shape = (len(nodes), len(years), len(measures))
+    panel = np.lib.format.open_memmap(fname, "w+", "float32", shape)
+    panel[:] = np.nan
+    panel[node_codes, year_codes, measure_codes] = df["value"].values
+    panel.flush()
+    del panel
+    if not wide:
+        return
+    wide_df = df.set_index(["node", "centrality", "year"])["value"].unstack()
+    full = pd.MultiIndex.from_product([nodes, measures],
+                                      names=["node", "centrality"])
+    wide_df = wide_df.reindex(full).reset_index(level=1)
+    wide_df.columns = [str(c) for c in wide_df.columns]
+    fname = f"{TARGET_FOLDER}yearly_centr_{label}.csv"
+    wide_df.to_csv(fname, index_label="node", encoding="utf8")
+
+
 def p_to_stars(p, thres=(0.1, 0.05, 0.01)):
     """Return stars for significance values."""
     stars = []
@@ -56,24 +229,109 @@ def p_to_stars(p, thres=(0.1, 0.05, 0.01)):
     return "".join(stars)
 
 
-def global_analysis(H, G):
-    """Return Series with network descriptives."""
+def global_analysis(H, G, nf=None, clust=None):
+    """Return Series with network descriptives.
+
+    Average path length, diameter and effective diameter follow from the
+    neighborhood function of the giant component, which is computed
+    exactly unless HyperANF estimate `nf` is provided.  The estimated
+    diameter is a lower bound, as HyperANF stops once no counter changes
+    anymore.  Local clustering coefficients `clust` are computed if not
+    provided.
+    """
     s = pd.Series()
     G = G.to_undirected()
+    if clust is None:
+        clust, _ = clustering(H)
     s["Nodes"] = nx.number_of_nodes(H)
     s["Links"] = nx.number_of_edges(H)
-    s['Avg. clustering'] = round(nx.average_clustering(H.to_undirected()), 3)
+    s['Avg. clustering'] = round(clust.mean(), 3)
     try:
         s["Components"] = nx.number_weakly_connected_components(H)
     except nx.NetworkXNotImplemented:  # Undirected network
         s["Components"] = nx.number_connected_components(H)
     s["Giant"] = nx.number_of_nodes(G)
     s["Density"] = round(nx.density(G), 4)
-    s["Avg. path length"] = nx.average_shortest_path_length(G)
-    s["Diameter"] = nx.diameter(G)
+    if nf is None:
+        nf = exact_neighborhood_function(G)
+    s["Avg. path length"], s["Effective diameter"] = distance_statistics(nf)
+    s["Diameter"] = len(nf) - 1
     return s
 
 
+def hash_nodes(nodes, precision, seed=0):
+    """Return HyperLogLog register index and rank for each node, using
+    a SplitMix64 hash of the node's position.
+    """
+    with np.errstate(over="ignore"):
+        h = np.arange(len(nodes), dtype="uint64") + np.uint64(seed)
+        h = h + np.uint64(0x9E3779B97F4A7C15)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        h = h ^ (h >> np.uint64(31))
+    idx = (h & np.uint64((1 << precision) - 1)).astype("int64")
+    w = h >> np.uint64(precision)
+    w[w == 0] = np.uint64(1) << np.uint64(63 - precision)
+    lowest = w & (~w + np.uint64(1))
+    rank = np.log2(lowest.astype(float)).astype("uint8") + 1
+    return idx, rank
+
+
+def hll_estimate(regs):
+    """Return HyperLogLog cardinality estimates for each row of registers."""
+    m = regs.shape[1]
+    alpha = 0.7213/(1 + 1.079/m)
+    est = alpha*m*m/np.exp2(-regs.astype(float)).sum(axis=1)
+    zeros = (regs == 0).sum(axis=1)
+    small = (est <= 2.5*m) & (zeros > 0)
+    est[small] = m*np.log(m/zeros[small])
+    return est
+
+
+def neighborhood_function(G, precision=PRECISION, seed=0, chunk=CHUNK):
+    """Return Series with the estimated number of node pairs within
+    distance t of each other, using HyperANF-style HyperLogLog counters
+    (Boldi et al., 2011).  Runs until no counter changes anymore.
+
+    Counters are propagated over blocks of `chunk` edges, such that
+    temporary arrays hold at most `chunk` rows of registers.
+    """
+    nodes, edges = edge_array(G)
+    src = np.concatenate([edges[:, 0], edges[:, 1]])
+    dst = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(src, kind="mergesort")
+    src, dst = src[order], dst[order]
+    blocks = []
+    for i in range(0, len(src), chunk):
+        heads, starts = np.unique(src[i:i+chunk], return_index=True)
+        blocks.append((dst[i:i+chunk], heads, starts))
+    regs = np.zeros((len(nodes), 2**precision), dtype="uint8")
+    idx, rank = hash_nodes(nodes, precision, seed)
+    regs[np.arange(len(nodes)), idx] = rank
+    nf = [hll_estimate(regs).sum()]
+    while blocks:
+        new = regs.copy()
+        for block, heads, starts in blocks:
+            reached = np.maximum.reduceat(regs[block], starts, axis=0)
+            new[heads] = np.maximum(new[heads], reached)
+        if (new == regs).all():
+            break
+        regs = new
+        nf.append(hll_estimate(regs).sum())
+    return pd.Series(nf)
+
+
+def long_records(df, year):
+    """Return long-format float32 records (node, year, measure, value) of
+    node-wise measures, without missing values.
+    """
+    df = (df.astype("float32").rename_axis("node").reset_index()
+            .melt(id_vars="node", var_name="centrality")
+            .dropna(subset=["value"]))
+    df["year"] = int(year)
+    return df
+
+
 def num_sec_neigh(node, G):
     """Return number of unique second-order neighbors."""
     neigh_sec_order = nx.single_source_shortest_path_length(G, node, cutoff=2)
@@ -81,15 +339,29 @@ def num_sec_neigh(node, G):
 
 
 def main():
-    auth = pd.DataFrame(columns=['index', 'centrality'])
-    com = pd.DataFrame(columns=['index', 'centrality'])
+    records = {'auth': [], 'com': []}
     global_auth = pd.DataFrame()
     global_com = pd.DataFrame()
+    distances = {'auth': {}, 'com': {}}
+    dirty = read_dirty_years() if INCREMENTAL else None
+    if dirty is not None:
+        try:
+            previous = {label: read_previous(label, dirty) for label in records}
+        except FileNotFoundError:  # No previous run
+            dirty = None
+        else:
+            for label, (old, _, nf) in previous.items():
+                records[label].append(old)
+                distances[label] = nf
+            global_auth = previous['auth'][1]
+            global_com = previous['com'][1]
     print(">>> Now working on:")
     for file in sorted(glob(NETWORK_FOLDER + "*.gexf")):
         # Read in
         n_id = basename(splitext(file)[0])
         year = n_id[:4]
+        if dirty is not None and int(year) not in dirty:
+            continue
         print("...", n_id)
         H = nx.read_gexf(file)
         G = giant(H)
@@ -101,23 +373,26 @@ def main():
 
         # Compute centralities
         new = compute_centralities(H, G)
+        clust, transitivity = clustering(H)
+        new["clustering"] = clust
+        print(f"    transitivity: {transitivity:.3f}")
         for col in ["eigenvector", "betweenness"]:
             new[col + "_rank"] = new[col].rank(method="min", ascending=False)
 
         # Global measures
-        s = global_analysis(H, G)
+        nf = None
+        if APPROXIMATE:
+            nf = neighborhood_function(G.to_undirected())
+            distances[n_id[5:]][year] = nf
+        s = global_analysis(H, G, nf, clust)
         rho = spearmanr(new["betweenness"], new["eigenvector"], nan_policy='omit')
         s['rho'] = f"{rho[0]:.2f}{p_to_stars(rho[1])}"
 
-        # Add to DataFrame
-        new = (new.reset_index()
-                  .melt(id_vars=['index'], var_name='centrality',
-                        value_name=year))
+        # Add to storage
+        records[n_id[5:]].append(long_records(new, year))
         if n_id.endswith('auth'):
-            auth = auth.merge(new, "outer", on=['index', 'centrality'])
             global_auth[year] = s
         elif n_id.endswith('com'):
-            com = com.merge(new, "outer", on=['index', 'centrality'])
             global_com[year] = s
 
         # Statistics
@@ -128,20 +403,28 @@ def main():
 
     # WRITE OUT
     t = [('Overall', k) for k in ['Size', 'Links', 'Avg. clustering', 'Components']]
+    approx = " (approx.)" if APPROXIMATE else ""
     t.extend([('Giant', k) for k in
-             ['Size', 'Density', "Avg. path length", "Diameter", "rho"]])
-    networks = [('auth', auth, global_auth), ('com', com, global_com)]
-    for label, df1, df2 in networks:
+             ['Size', 'Density', f"Avg. path length{approx}",
+              f"Effective diameter{approx}", f"Diameter{approx}", "rho"]])
+    networks = [('auth', global_auth), ('com', global_com)]
+    for label, df2 in networks:
         # Centralities
-        df1 = df1.sort_values(['index', 'centrality']).set_index('index')
-        fname = f"{TARGET_FOLDER}yearly_centr_{label}.csv"
-        df1.to_csv(fname, index_label="node", encoding="utf8")
+        write_centralities(records[label], label)
         # Global statistics
-        df2 = df2.T
-        df2['Avg. path length'] = df2['Avg. path length'].astype(float).round(2)
+        df2 = df2.T.sort_index()
+        df2.to_csv(f"{TARGET_FOLDER}global_{label}.csv", index_label="year")
+        for col in ['Avg. path length', 'Effective diameter']:
+            df2[col] = df2[col].astype(float).round(2)
         df2.columns = pd.MultiIndex.from_tuples(t)
         fname = f"{OUTPUT_FOLDER}Tables/network_{label}.tex"
-        df2.to_latex(fname, multicolumn_format='c', column_format='lrrrr|rrrrr')
+        df2.to_latex(fname, multicolumn_format='c', column_format='lrrrr|rrrrrr')
+        # Distance distribution
+        if APPROXIMATE:
+            nf = pd.DataFrame(distances[label]).sort_index(axis=1).round(1)
+            fname = f"{OUTPUT_FOLDER}Tables/neighborhood_function_{label}.csv"
+            nf.to_csv(fname, index_label="distance")
+    write_dirty_years(set())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Author:   Michael E. Rose <michael.ernst.rose@gmail.com>
+"""Compares global network structure with ensembles of degree-preserving
+randomized networks (double edge swaps) to obtain z-scores for clustering,
+average path length and the rank correlation of centralities.
+"""
+
+from glob import glob
+from multiprocessing import Pool
+from os.path import basename, splitext
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.stats import spearmanr
+
+from _205_compute_centralities import clustering, distance_statistics,\
+    edge_array, giant, neighborhood_function
+
+NETWORK_FOLDER = "./200_yearly_networks/"
+OUTPUT_FOLDER = "./990_output/"
+
+N_DRAWS = 200  # Number of randomized networks per yearly network
+N_SWAPS = 10  # Number of attempted double edge swaps per edge
+N_PROCESSES = None  # Number of worker processes (None: all CPUs)
+PRECISION = 8  # Precision of HyperLogLog counters for path lengths
+BETWEENNESS_SAMPLES = 100  # Number of pivots for approximate betweenness
+
+
+def describe(G, seed=0):
+    """Return Series with average clustering, average path length of the
+    giant component and Spearman's rho of betweenness and eigenvector
+    centrality in the giant component of an undirected network.
+    """
+    s = pd.Series()
+    clust, _ = clustering(G)
+    s["clustering"] = clust.mean()
+    H = giant(G)
+    nf = neighborhood_function(H, precision=PRECISION, seed=seed)
+    s["path_length"], _ = distance_statistics(nf)
+    k = min(BETWEENNESS_SAMPLES, nx.number_of_nodes(H))
+    df = pd.DataFrame({
+        "betweenness": nx.betweenness_centrality(H, k=k, seed=seed),
+        "eigenvector": nx.eigenvector_centrality_numpy(H)})
+    s["rho"] = spearmanr(df["betweenness"], df["eigenvector"],
+                         nan_policy="omit")[0]
+    return s
+
+
+def rewire(edges, n_nodes, swaps=N_SWAPS, seed=0):
+    """Return edge array randomized by double edge swaps which preserve
+    the degree sequence, rejecting self-loops and multi-edges.
+
+    Each round proposes swaps for a random pairing of all edges at once;
+    there are 2 * `swaps` rounds, i.e. `swaps` attempts per edge.
+    """
+    rng = np.random.RandomState(seed)
+    edges = edges.copy()
+    half = len(edges)//2
+
+    def key(u, v):
+        return np.minimum(u, v)*n_nodes + np.maximum(u, v)
+
+    for _ in range(2*swaps):
+        perm = rng.permutation(len(edges))
+        i, j = perm[:half], perm[half:2*half]
+        a, b = edges[i, 0], edges[i, 1]
+        c, d = edges[j, 0], edges[j, 1]
+        flip = rng.rand(half) < 0.5
+        c, d = np.where(flip, d, c), np.where(flip, c, d)
+        k1, k2 = key(a, d), key(c, b)
+        current = key(edges[:, 0], edges[:, 1])
+        ok = ((a != d) & (c != b) & (k1 != k2) &
+              ~np.isin(k1, current) & ~np.isin(k2, current))
+        # Reject swaps that would create the same edge twice
+        proposed = np.concatenate([k1[ok], k2[ok]])
+        _, inv, counts = np.unique(proposed, return_inverse=True,
+                                   return_counts=True)
+        dup = counts[inv] > 1
+        n_ok = ok.sum()
+        ok[np.flatnonzero(ok)[dup[:n_ok] | dup[n_ok:]]] = False
+        edges[i[ok]] = np.column_stack([a[ok], d[ok]])
+        edges[j[ok]] = np.column_stack([c[ok], b[ok]])
+    return edges
+
+
+def simulate(args):
+    """Describe one randomized version of a network."""
+    edges, n_nodes, seed = args
+    G = nx.Graph()
+    G.add_nodes_from(range(n_nodes))
+    G.add_edges_from(rewire(edges, n_nodes, seed=seed).tolist())
+    return describe(G, seed)
+
+
+def main():
+    out = {'auth': {}, 'com': {}}
+    print(">>> Now working on:")
+    with Pool(N_PROCESSES) as pool:
+        for file in sorted(glob(NETWORK_FOLDER + "*.gexf")):
+            # Read in
+            n_id = basename(splitext(file)[0])
+            year = n_id[:4]
+            print("...", n_id)
+            H = nx.Graph(nx.read_gexf(file).to_undirected())
+            nodes, edges = edge_array(H)
+            H = nx.relabel_nodes(H, {n: i for i, n in enumerate(nodes)})
+
+            # Compare with ensemble
+            observed = describe(H)
+            tasks = [(edges, len(nodes), seed) for seed in range(1, N_DRAWS+1)]
+            draws = pd.DataFrame(pool.map(simulate, tasks))
+            std = draws.std()  # z-scores undefined where all draws agree
+            z = (observed - draws.mean())/std.where(std > 0)
+            s = pd.concat([observed, draws.mean(), z],
+                          keys=["Observed", "Random", "z-score"])
+            out[n_id[5:]][year] = s
+
+    # WRITE OUT
+    for label, d in out.items():
+        df = pd.DataFrame(d).T.round(3)
+        df.columns = df.columns.swaplevel()
+        df = df.sort_index(axis=1, level=0, sort_remaining=False)
+        fname = f"{OUTPUT_FOLDER}Tables/null_models_{label}.tex"
+        df.to_latex(fname, multicolumn_format='c')
+
+
+if __name__ == '__main__':
+    main()
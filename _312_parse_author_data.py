@@ -10,6 +10,9 @@ from pybliometrics.scopus import AuthorRetrieval, AffiliationRetrieval,\
 from tqdm import tqdm
 
 TARGET_FOLDER = "./312_author_data/"
+PUBLICATION_FILE = TARGET_FOLDER + "publications.csv"
+AFFILIATION_FILE = TARGET_FOLDER + "affiliations.csv"
+COAUTHOR_FILE = TARGET_FOLDER + "coauthors.csv"
 MAX_YEAR = "2015"  # Year beyond which we're not interested in publications
 RESEARCH_TYPES = ("ar", "re", "cp", "sh")
 PLATFORMS = {"60016621", "60020337", "60007893"}
@@ -36,6 +39,15 @@ def get_aff_type(affiliations):
         return None
 
 
+def get_aff_ids(affs):
+    """Return list of integer affiliation IDs from a dash-joined string,
+    without platform affiliations; [None] if none is left.
+    """
+    aff_ids = [int(a) for a in affs.split("-")
+               if a.isdigit() and a not in PLATFORMS]
+    return aff_ids or [None]
+
+
 def get_scopus_nodes(G):
     """Return set of nodes whose ID is a number."""
     return set([str(n) for n in G if n.isdigit()])
@@ -65,6 +77,21 @@ def perform_query(auth_id, refresh=100, fields=["eid", "title"]):
     return zip(*info)
 
 
+def read_affiliations():
+    """Read long table of affiliations: one row per researcher, EID and
+    affiliation ID (missing if unknown) with publication year.
+    """
+    dtypes = {"scopus_id": "int64", "eid": str, "year": "uint16",
+              "aff_id": "Int64"}
+    return pd.read_csv(AFFILIATION_FILE, dtype=dtypes, encoding="utf8")
+
+
+def read_coauthors():
+    """Read long table of authorships: one row per EID and coauthor."""
+    dtypes = {"eid": str, "coauthor": "int64"}
+    return pd.read_csv(COAUTHOR_FILE, dtype=dtypes, encoding="utf8")
+
+
 def read_nodes():
     """Read all nodes from the networks if they are identified."""
     import networkx as nx
@@ -75,6 +102,15 @@ def read_nodes():
     return scopus_nodes
 
 
+def read_publications():
+    """Read long table of publications: one row per researcher and EID
+    with publication year and source.
+    """
+    dtypes = {"scopus_id": "int64", "eid": str, "year": "uint16",
+              "source": str}
+    return pd.read_csv(PUBLICATION_FILE, dtype=dtypes, encoding="utf8")
+
+
 def main():
     scopus_nodes = read_nodes()
     print(f">>> Looking up {len(scopus_nodes):,} researchers")
@@ -83,6 +119,9 @@ def main():
     pubs = {}
     data = {}
     missing = []
+    long_pubs = []
+    long_affs = []
+    coauthor_lists = {}
     for node in tqdm(scopus_nodes):
         # Document information
         eids, sources, years, coauthors, affs = perform_query(node)
@@ -109,6 +148,11 @@ def main():
         pubs[node] = {"eids": "|".join(eids), "sources": "|".join(sources),
                       "years": "|".join(years), "aff_ids": "|".join(affs),
                       "coauthors": "|".join(coauthors)}
+        long_pubs.extend(zip([node]*len(eids), eids, years, sources))
+        long_affs.extend((node, eid, year, aff_id)
+                         for eid, year, aff in zip(eids, years, affs)
+                         for aff_id in get_aff_ids(aff))
+        coauthor_lists.update(zip(eids, coauthors))
     if missing:
         print(f">>> {len(missing)} researchers w/o research publication "
               f"before {MAX_YEAR}:\n{','.join(missing)}")
@@ -118,6 +162,18 @@ def main():
     data.to_csv(TARGET_FOLDER + "data.csv", index_label="scopus_id")
     pubs = pd.DataFrame(pubs).T.sort_index()
     pubs.to_csv(TARGET_FOLDER + "pub_list.csv", index_label="scopus_id")
+    cols = ["scopus_id", "eid", "year", "source"]
+    long_pubs = pd.DataFrame(long_pubs, columns=cols)
+    long_pubs = long_pubs.sort_values(["scopus_id", "year", "eid"])
+    long_pubs.to_csv(PUBLICATION_FILE, index=False)
+    cols = ["scopus_id", "eid", "year", "aff_id"]
+    long_affs = pd.DataFrame(long_affs, columns=cols).astype({"aff_id": "Int64"})
+    long_affs = long_affs.sort_values(["scopus_id", "year", "eid", "aff_id"])
+    long_affs.to_csv(AFFILIATION_FILE, index=False)
+    coauthors = [(eid, int(a)) for eid, auths in coauthor_lists.items()
+                 for a in (auths or "").split(";") if a.isdigit()]
+    coauthors = pd.DataFrame(coauthors, columns=["eid", "coauthor"])
+    coauthors.sort_values(["eid", "coauthor"]).to_csv(COAUTHOR_FILE, index=False)
 
 
 if __name__ == '__main__':
@@ -6,21 +6,34 @@ publication count, yearly citations and Euclidean index of citations.
 You need a special API key by Scopus to access the citation view.
 """
 
+import numpy as np
 import pandas as pd
-from scholarmetrics import euclidean
-from pybliometrics.scopus import CitationOverview
-from tqdm import tqdm
 
-from _005_create_bibliography import YEARS
-from _312_parse_author_data import MAX_YEAR
+from _005_create_bibliography import CITATION_YEARS, YEARS, citation_matrix,\
+    update_citations
+from _312_parse_author_data import MAX_YEAR, read_publications
 
-SOURCE_FILE = "./312_author_data/pub_list.csv"
 TARGET_FILE = "./313_author_metrics/metrics.csv"
 
 
-def compute_euclid(df):
-    """Return yearly Euclidean index except when all entries are nan."""
-    return df.dropna(how="all", axis=1).cumsum(axis=1).apply(euclidean)
+def count_gaps(X):
+    """Count years without additional (non-missing) output since the first
+    year with positive cumulative output in a researcher-by-year array.
+    """
+    cum = cumulative_sum(X)
+    cum[cum == 0] = np.nan
+    out = np.zeros(X.shape)
+    out[:, 1:] = (cum[:, 1:] == cum[:, :-1]).cumsum(axis=1)
+    return out
+
+
+def cumulative_sum(X):
+    """Cumulate a researcher-by-year array over years, skipping but
+    preserving missing values.
+    """
+    out = np.nancumsum(X, axis=1)
+    out[np.isnan(X)] = np.nan
+    return out
 
 
 def explode(df, col, label=None):
@@ -34,15 +47,20 @@ def explode(df, col, label=None):
               .rename(columns={0: label}))
 
 
-def get_yearly_citations(eid, pubyear, refresh=False):
-    """Return dict of yearly citations."""
-    co = CitationOverview(eid, pubyear, refresh=refresh)
-    return {y: int(c) for y, c in co.cc}
-
-
-def nan_preserving_sum(df):
-    """Sum values except when all entries are nan."""
-    return df.dropna(how="all", axis=1).fillna(0).sum(axis=0)
+def rolling_sum(X, window, min_periods=0):
+    """Sum a researcher-by-year array over the current and the past
+    `window`-1 years, requiring `min_periods` non-missing values.
+    """
+    valid = ~np.isnan(X)
+    zeros = np.zeros((X.shape[0], 1))
+    sums = np.hstack([zeros, np.where(valid, X, 0).cumsum(axis=1)])
+    counts = np.hstack([zeros, valid.cumsum(axis=1)])
+    start = np.maximum(np.arange(X.shape[1]) + 1 - window, 0)
+    out = sums[:, 1:] - sums[:, start]
+    out[(counts[:, 1:] - counts[:, start]) < max(min_periods, 1)] = np.nan
+    if min_periods == 0:
+        out[np.isnan(out)] = 0
+    return out
 
 
 def read_jif(asjc=(2000, 1400)):
@@ -57,34 +75,86 @@ def read_jif(asjc=(2000, 1400)):
     return jif.rename(columns={"Sourceid": "source"})
 
 
+def segment_citations(eid_cites):
+    """Return yearly citations and Euclidean index of citations for each
+    researcher-year, from yearly citation counts of EIDs (rows) indexed
+    by researchers.  Researcher-years without any information are dropped.
+    """
+    df = eid_cites.sort_index(kind="mergesort")
+    M = df.values.astype(float)
+    ids, starts = np.unique(df.index.values, return_index=True)
+    valid = np.add.reduceat((~np.isnan(M)).astype(int), starts, axis=0) > 0
+    cites = np.add.reduceat(np.nan_to_num(M), starts, axis=0)
+    cum = np.nan_to_num(cumulative_sum(M))
+    euclid = np.sqrt(np.add.reduceat(cum**2, starts, axis=0))
+    cites[~valid] = np.nan
+    euclid[~valid] = np.nan
+    features = {"euclid": euclid, "yearly_cites": cites}
+    return to_long(ids, df.columns.values, features, ("scopus_id", "year"),
+                   dropna=True)
+
+
+def shift(X, periods):
+    """Shift a researcher-by-year array by `periods` years (positive:
+    lag, negative: lead), filling with missing values.
+    """
+    out = np.full(X.shape, np.nan)
+    if periods > 0:
+        out[:, periods:] = X[:, :-periods]
+    elif periods < 0:
+        out[:, :periods] = X[:, -periods:]
+    else:
+        out[:] = X
+    return out
+
+
+def to_long(ids, years, features, names=("scopus_id", "t"), dropna=False):
+    """Return long DataFrame with one row per researcher-year and one
+    column per researcher-by-year array in dict `features`.
+    """
+    df = pd.DataFrame({names[0]: np.repeat(ids, len(years)),
+                       names[1]: np.tile(years, len(ids))})
+    for label, X in features.items():
+        df[label] = X.ravel()
+    if dropna:
+        df = df.dropna(how="all", subset=list(features))
+    return df
+
+
+def to_panel(df, id_col, time_col, value_col):
+    """Return researcher IDs, consecutive years and dense researcher-by-year
+    array of a long DataFrame, with missing values for absent pairs.
+    """
+    ids = pd.Index(sorted(df[id_col].unique()))
+    years = np.arange(df[time_col].min(), df[time_col].max() + 1)
+    X = np.full((len(ids), len(years)), np.nan)
+    rows = ids.get_indexer(df[id_col])
+    cols = df[time_col].values.astype("int64") - years[0]
+    X[rows, cols] = df[value_col].values
+    return ids, years, X
+
+
 def main():
     # Read in
-    cols = ["scopus_id", "eids", "years", "sources"]
-    df = pd.read_csv(SOURCE_FILE, index_col=0, usecols=cols, encoding="utf8")
-    for col in df.columns:
-        df[col] = df[col].str.split("|")
+    df = read_publications()
 
     # Inform about publications in study period
-    years = explode(df, "years", "year")
-    eids = explode(df, "eids", "eid")
-    temp = pd.concat([eids, years], axis=1).drop_duplicates(subset="eid")
-    temp["year"] = temp["year"].astype("uint32")
+    temp = df.drop_duplicates(subset="eid")
     pubs_within = temp["year"].between(int(YEARS[0]), int(YEARS[1])).sum()
     del temp
-    print(f">>> Found {eids['eid'].nunique():,} publications overall, and "
+    print(f">>> Found {df['eid'].nunique():,} publications overall, and "
           f"{pubs_within:,} between {YEARS[0]} and {YEARS[1]}")
 
     # Publication count
     print(">>> Counting publications...")
-    pubs = (years.groupby(["scopus_id", "year"]).size()
+    pubs = (df.groupby(["scopus_id", "year"]).size()
                  .reset_index()
                  .rename(columns={0: "yearly_pubs"}))
     pubs["year"] = pubs["year"].astype("int32")
 
     # Weighted publication count
     print(">>> Counting JIF-weighted publications...")
-    sources = explode(df, "sources", "source")
-    temp = pd.concat([years, sources.drop("scopus_id", axis=1)], axis=1)
+    temp = df[["scopus_id", "year", "source"]].copy()
     temp['year'] = temp['year'].astype("int32")
     jif = read_jif()
     temp = temp.merge(jif, "left", on=['source', 'year'], indicator=True)
@@ -111,34 +181,16 @@ def main():
     del temp
 
     # Yearly citation count
-    temp = pd.concat([eids, years["year"]], axis=1).reset_index(drop=True)
-    total = temp.shape[0]
-    print(f">>> Searching yearly citation counts for {total:,} articles")
-    yearly_cites = {}
-    for idx, row in tqdm(temp.iterrows(), total=temp.shape[0]):
-        try:
-            yearly_cites[row["eid"]] = get_yearly_citations(row["eid"], row["year"])
-        except Exception as e:
-            print("\n", e, row["eid"])
-            continue
+    store = update_citations(df["eid"], df["year"])
     print(">>> Computing citations and Euclidean index of citations")
-    yearly_cites = pd.DataFrame(yearly_cites).T
-    yearly_cites = yearly_cites[sorted(yearly_cites.columns)]
-    eid_cites = eids.join(yearly_cites, how="left", on="eid")
-    eid_cites = eid_cites.drop("eid", axis=1).set_index("scopus_id")
-    grouped = eid_cites.groupby(eid_cites.index)
-    cites = grouped.apply(nan_preserving_sum)
-    cites = (cites.reset_index()
-                  .rename(columns={"level_1": "year", 0: "yearly_cites"}))
-
-    # Euclidean index of citations
-    euclid = grouped.apply(compute_euclid)
-    euclid = (euclid.reset_index()
-                    .rename(columns={"level_1": "year", 0: "euclid"}))
+    years = np.arange(CITATION_YEARS[0], CITATION_YEARS[1]+1)
+    eid_cites = pd.DataFrame(citation_matrix(df["eid"], store),
+                             index=df["scopus_id"], columns=years)
+    eid_cites = eid_cites.dropna(how="all", axis=1)  # Years with data only
+    out = segment_citations(eid_cites)
 
     # Write out
     print(">>> Finishing up...")
-    out = euclid.merge(cites, "left", on=["scopus_id", "year"])
     out = (out.merge(pubs, "left", on=["scopus_id", "year"])
               .merge(wpubs, "left", on=["scopus_id", "year"])
               .sort_values(['scopus_id', 'year']))
@@ -4,32 +4,35 @@
 and descriptives.
 """
 
-from glob import glob
-
 import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix
 
 from _005_create_bibliography import standardize
 from _116_list_informal_pairs import read_ack_file
 from _200_build_networks import write_stats
+from _205_compute_centralities import centrality_frame
 from _313_compute_author_metrics import explode
 
 SCOPUS_FILE = "./005_bibliometric_information/Scopus.csv"
 METRICS_FILE = "./313_author_metrics/metrics.csv"
-CENTR_FOLDER = "./205_centralities/"
 TARGET_FILE = "./580_paper_sample/master.csv"
+MATCH_FILE = "./580_paper_sample/title_matches.csv"
 OUTPUT_FOLDER = "./990_output/"
 
+NGRAM = 3  # Length of character n-grams to compare titles
+YEAR_TOLERANCE = 1  # Maximum difference in years for candidate titles
+MATCH_THRESHOLD = None  # Similarity from which candidates replace titles
+
 
-def aggregate(df, data, col, label=None, merge_cols=['scopus_id', 'year']):
-    """Explode rows containing multiple individuals and merge on them."""
-    label = label or col
-    temp = explode(df, col, "scopus_id")
-    data = data.set_index(merge_cols)
-    return (temp.set_index(merge_cols)
-                .join(data, how="left")
-                .groupby(["simple_title"]).sum()
-                .add_prefix(label + "_"))
+def aggregate(incidence, data, label, merge_cols=['scopus_id', 'year']):
+    """Sum numeric columns of `data` over the individuals of each paper
+    using a paper-by-person-year incidence matrix.
+    """
+    titles, keys, A = incidence
+    X = data.set_index(merge_cols).reindex(keys).select_dtypes("number")
+    return pd.DataFrame(A @ X.fillna(0).values, index=titles,
+                        columns=X.columns).add_prefix(label + "_")
 
 
 def clean_jel_codes(entries):
@@ -55,16 +58,6 @@ def count(s):
                 return 2
 
 
-def custom_pivot(df, id_var, var_name, unstack_by):
-    """Reshape DataFrame organized in years as columns
-    to years in one column.
-    """
-    df = df.melt(id_vars=[id_var] + [unstack_by], var_name=var_name)
-    df = df.set_index([id_var] + [var_name] + [unstack_by]).unstack()
-    df.columns = df.columns.get_level_values(1)
-    return df.dropna(how='all').reset_index()
-
-
 def get_jel_categories(s):
     """Return set of jel categories."""
     cats = set()
@@ -79,14 +72,74 @@ def get_jel_categories(s):
     return list(cats)
 
 
-def read_centrality_file(f):
-    """Read file with centralities and add prefixes."""
-    from os.path import basename, splitext
-    df = pd.read_csv(f, low_memory=False)
-    net = splitext(basename(f))[0].split("_")[2]
-    df['centrality'] = net + "_" + df['centrality']
-    df['node'] = df['node'].astype(str)
-    return df[df['node'].str.isnumeric().fillna(True)]
+def match_titles(left, right, n_candidates=3, n=NGRAM, tol=YEAR_TOLERANCE):
+    """Return DataFrame with the most similar titles in `right` for each
+    title in `left` (both indexed by standardized titles), comparing only
+    titles of the same journal and with similar year.
+
+    Similarity is the Jaccard index of the sets of character n-grams.
+    """
+    out = []
+    for journal, lgroup in left.groupby("journal"):
+        rgroup = right[right["journal"] == journal]
+        if rgroup.empty:
+            continue
+        M = ngram_matrix(lgroup.index.append(rgroup.index), n)
+        L, R = M[:lgroup.shape[0]], M[lgroup.shape[0]:]
+        shared = (L @ R.T).tocoo()
+        sizes_l = np.asarray(L.sum(axis=1)).ravel()[shared.row]
+        sizes_r = np.asarray(R.sum(axis=1)).ravel()[shared.col]
+        temp = pd.DataFrame({
+            "simple_title": lgroup.index[shared.row],
+            "candidate": rgroup.index[shared.col],
+            "similarity": shared.data/(sizes_l + sizes_r - shared.data)})
+        diff = (lgroup["year"].values[shared.row].astype(int) -
+                rgroup["year"].values[shared.col].astype(int))
+        out.append(temp[np.abs(diff) <= tol])
+    cols = ["simple_title", "candidate", "similarity"]
+    out = pd.concat(out) if out else pd.DataFrame(columns=cols)
+    out = (out.sort_values(["simple_title", "similarity"],
+                           ascending=[True, False], kind="mergesort")
+              .groupby("simple_title").head(n_candidates))
+    out["rank"] = out.groupby("simple_title").cumcount() + 1
+    return out.reset_index(drop=True)
+
+
+def ngram_matrix(titles, n=NGRAM):
+    """Return sparse binary title-by-n-gram matrix."""
+    vocab = {}
+    rows, cols = [], []
+    for i, title in enumerate(titles):
+        grams = {title[j:j+n] for j in range(max(len(title)-n+1, 1))}
+        cols.extend(vocab.setdefault(g, len(vocab)) for g in grams)
+        rows.extend([i]*len(grams))
+    return csr_matrix((np.ones(len(rows)), (rows, cols)),
+                      shape=(len(titles), len(vocab)))
+
+
+def person_year_incidence(df, col):
+    """Return titles, person-years and sparse paper-by-person-year matrix
+    counting the individuals in column `col` of `df` (indexed by
+    simple_title and year).  Papers without individuals are dropped.
+    """
+    temp = df[col].explode().dropna().reset_index()
+    titles = pd.Index(temp["simple_title"].unique(), name="simple_title")
+    pairs = pd.MultiIndex.from_arrays([temp[col].astype(str),
+                                       temp["year"].astype("uint16")],
+                                      names=["scopus_id", "year"])
+    keys = pairs.unique()
+    rows = titles.get_indexer(temp["simple_title"])
+    A = csr_matrix((np.ones(len(rows)), (rows, keys.get_indexer(pairs))),
+                   shape=(len(titles), len(keys)))
+    return titles, keys, A
+
+
+def read_centralities(networks=("com", "auth")):
+    """Read centrality panels of identified nodes with prefixed measures."""
+    dfs = [centrality_frame(net, prefix=True).set_index(["node", "year"])
+           for net in networks]
+    df = pd.concat(dfs, axis=1, sort=True).reset_index()
+    return df[df['node'].str.isnumeric()]
 
 
 def main():
@@ -105,6 +158,28 @@ def main():
     # Merge with Scopus
     acks.index = acks['title'].apply(standardize)
     scopus_df = pd.read_csv(SCOPUS_FILE, index_col=0, encoding="utf8")
+
+    # Find candidates for titles without exact match
+    unmatched = acks[~acks.index.isin(scopus_df.index)]
+    candidates = scopus_df[~scopus_df.index.isin(acks.index)]
+    matches = match_titles(unmatched, candidates)
+    cols = ["journal", "year", "title"]
+    report = (unmatched[cols].rename_axis("simple_title").reset_index()
+                             .merge(matches, "left", on="simple_title")
+                             .merge(candidates[["eid"] + cols[1:]]
+                                    .add_suffix("_candidate"), "left",
+                                    left_on="candidate", right_index=True))
+    report.to_csv(MATCH_FILE, index=False, encoding="utf8")
+    print(f">>> {unmatched.shape[0]:,} acknowledgements w/o exact title match; "
+          f"{matches['simple_title'].nunique():,} with candidates")
+    if MATCH_THRESHOLD:
+        best = matches[(matches["rank"] == 1) &
+                       (matches["similarity"] >= MATCH_THRESHOLD)]
+        best = best.drop_duplicates(subset="candidate", keep=False)
+        acks = acks.rename(index=dict(zip(best["simple_title"],
+                                          best["candidate"])))
+
+    # Merge with Scopus
     df = (scopus_df.drop(["title", "journal", "year"], axis=1)
                    .join(acks, how="inner"))
     df.index.name = "simple_title"
@@ -131,27 +206,27 @@ def main():
 
     # Add metrics for authors and commenters
     df = df.reset_index().set_index(["simple_title", "year"])
+    incidences = {col: person_year_incidence(df, col)
+                  for col in ("auth", "coms")}
     dtypes = {'scopus_id': 'str', 'year': 'uint16'}
     metrics = pd.read_csv(METRICS_FILE, encoding="utf8", dtype=dtypes)
     metrics = metrics.drop(columns=['yearly_pubs', 'yearly_wpubs'], axis=1)
     metrics["cumcites"] = metrics.groupby("scopus_id")["yearly_cites"].cumsum()
     metrics['year'] = metrics['year'] + 1  # Use previous year's values
-    auth_metrics = aggregate(df, metrics, "auth")
-    coms_metrics = aggregate(df, metrics, "coms")
+    auth_metrics = aggregate(incidences["auth"], metrics, "auth")
+    coms_metrics = aggregate(incidences["coms"], metrics, "coms")
     del metrics
 
     # Add centralities for authors and commenters
-    files = sorted(glob(CENTR_FOLDER + "*.csv"))
-    centr = pd.concat([read_centrality_file(f) for f in files], axis=0, sort=True)
-    centr = custom_pivot(centr, id_var='node', var_name='year', unstack_by='centrality')
+    centr = read_centralities()
     centr = centr.rename(columns={"node": "scopus_id"})
     centr['year'] = centr['year'].astype('uint16') + 1  # Previous year's values
     for netw in ("com", "auth"):
         centr[netw + "_giant"] = (~centr[netw + '_eigenvector'].isnull())*1
     fill_cols = [c for c in centr if "rank" not in c]
     centr[fill_cols] = centr[fill_cols].fillna(0)
-    auth_centr = aggregate(df, centr, "auth")
-    coms_centr = aggregate(df, centr, "coms")
+    auth_centr = aggregate(incidences["auth"], centr, "auth")
+    coms_centr = aggregate(incidences["coms"], centr, "coms")
 
     # Combine and fill missings
     df = df.reset_index(level=1)
@@ -2,142 +2,202 @@
 # Author:   Michael E. Rose <michael.ernst.rose@gmail.com>
 """Computes measures of productivity for network neighbors
 based on journal impact factors.
+
+Neighborhoods are represented as yearly sparse adjacency matrices among
+identified researchers, and productivity as dense researcher-by-year
+matrix, such that all measures follow from sparse matrix products.
 """
 
 from glob import glob
+from os.path import basename
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix
 
-from _313_compute_author_metrics import explode, read_jif
+from _312_parse_author_data import read_coauthors, read_publications
+from _313_compute_author_metrics import read_jif, rolling_sum
 
 JIF_FILE = "./751_Journal_Impact_Factors/JIFs.csv"
-PUBLICATION_LIST = "./312_author_data/pub_list.csv"
 NETWORK_FOLDER = "./200_yearly_networks/"
 TARGET_FILE = "./770_network_neighbor_productivity/both.csv"
 
+STREAM = False  # Append results year by year to TARGET_FILE (rows by year)
+WINDOW = 5  # Years of networks in which first neighbors are considered
+
+
+def adjacency(edges, ids):
+    """Return sparse binary adjacency matrix from an array of directed
+    edges between researchers listed in `ids`.
+    """
+    n = len(ids)
+    rows = ids.get_indexer(edges[:, 0])
+    cols = ids.get_indexer(edges[:, 1])
+    A = csr_matrix((np.ones(len(edges)), (rows, cols)), shape=(n, n))
+    return A.sign()
+
+
+def compute_year(t, edges, P, Q, coauthors, wpubs, ids, years,
+                 window=WINDOW):
+    """Compute first and second neighbors' productivity of all researchers
+    in year t, using only the networks of years t until t+`window`-1.
 
-def compute_first_neigh_prod(neigh, wpubs, window=5):
+    Productivity matrices `P` and `Q` are indexed by `ids`; researchers
+    not listed there have no productivity.
+    """
+    edges = {label: {y: d[y] for y in range(t, t+window) if y in d}
+             for label, d in edges.items()}
+    if not any(edges.values()):
+        return None
+    k = t - years[0]
+    nodes = [e.ravel() for d in edges.values() for e in d.values()]
+    local = pd.Index(np.unique(np.concatenate(nodes)))
+    rows = ids.get_indexer(local)
+    p = np.where(rows > -1, P[rows, k], 0)
+    q = np.where(rows > -1, Q[rows, k], 0)
+    C = joint_matrix(wpubs[wpubs["t"] == t], coauthors, local)
+    out = []
+    for label, d in edges.items():
+        A = {y: adjacency(e, local) for y, e in d.items()}
+        if not A:
+            continue
+        first = first_neighbor_productivity(A.values(), p, C, local)
+        out.append(first.rename(f"qit1_{label}"))
+        if t in A:
+            second = second_neighbor_productivity(A[t], q, local)
+            out.append(second.rename(f"qit2_{label}"))
+    df = pd.concat(out, axis=1)
+    df.index.name = "scopus_id"
+    df["t"] = t
+    return df.set_index("t", append=True)
+
+
+def first_neighbor_productivity(A, p, C, ids):
     """Compute the productivity of first neighbors excluding joint
     publications.
+
+    A neighbor counts if it is a neighbor in any of the networks `A`.
+    The productivity of these neighbors (`p`) is reduced by the
+    publications they have jointly with the researcher (`C`).
     """
-    # Add years prior to actual observation
-    neigh = neigh.sort_values(["index", "t", "scopus_id"])
-    temp = neigh.copy()
-    for lag in range(1, window):
-        new = temp.copy()
-        new["t"] = new["t"]-lag
-        neigh = neigh.append(new)
-    neigh = neigh.drop_duplicates()
-    del temp, new
-    # Add neighbors' publications' JIF and exclude joint publications
-    neigh = neigh.merge(wpubs, "left", on=["scopus_id", "t"])
-    neigh = neigh[neigh.apply(find_coauthor, axis=1)].drop("authors", axis=1)
-    return neigh.groupby(["index", "t"])["SJR"].sum().reset_index()
-
-
-def find_coauthor(s):
-    """Whether `s["index"]` is not in `s["authors"]`."""
-    try:
-        return s["index"] not in s["authors"]
-    except TypeError:  # Coauthors missing for some strange reason
-        return True
-
-
-def get_neighbors(files):
-    """Return DataFrames with yearly direct and indirect neighbors"""
-    from os.path import basename
-    neigh_1st = {}
-    neigh_2nd = {}
+    W = sum(A).sign()
+    q = W @ p - np.asarray(W.multiply(C).sum(axis=1)).ravel()
+    rows = np.flatnonzero(np.diff(W.indptr))
+    return pd.Series(q[rows], index=ids[rows])
+
+
+def joint_matrix(wpubs, coauthors, ids):
+    """Return sparse matrix with the SJR of publications of researcher j
+    (columns) on which researcher i (rows) is coauthor, for researchers
+    listed in `ids`.
+    """
+    joint = coauthors.merge(wpubs[["scopus_id", "eid", "SJR"]], on="eid")
+    rows = ids.get_indexer(joint["author"])
+    cols = ids.get_indexer(joint["scopus_id"])
+    keep = (rows > -1) & (cols > -1)
+    vals = joint["SJR"].fillna(0).values[keep]
+    return csr_matrix((vals, (rows[keep], cols[keep])),
+                      shape=(len(ids), len(ids)))
+
+
+def productivity_matrix(wpubs, ids, years):
+    """Return dense researcher-by-year matrix of SJR-weighted publications."""
+    P = np.zeros((len(ids), len(years)))
+    rows = ids.get_indexer(wpubs["scopus_id"])
+    cols = wpubs["t"].values.astype("int64") - years[0]
+    np.add.at(P, (rows, cols), wpubs["SJR"].fillna(0).values)
+    return P
+
+
+def read_edges(files):
+    """Return dict of yearly arrays of directed edges (following
+    successors) among identified researchers.
+    """
+    edges = {}
     for file in files:
         G = nx.read_gexf(file)
-        year = basename(file)[:4]
-        neigh = {n: list(set([k for k in G[n].keys() if k.isdigit()]))
-                 for n in G.nodes() if n.isdigit()}
-        neigh_1st[year] = neigh
-        indir = {}
-        for node, neighs in neigh.items():
-            lst = [set(G[n].keys()) for n in neighs]
-            new = set([n for sl in lst for n in sl if n.isdigit()])
-            indir[node] = list(new - set(neighs))
-        neigh_2nd[year] = indir
-    first = pd.DataFrame.from_dict(neigh_1st).reset_index()
-    first = transform(first, "scopus_id")
-    second = pd.DataFrame.from_dict(neigh_2nd).reset_index()
-    second = transform(second, "scopus_id")
-    return first, second
-
-
-def cumulate_productivity(df, window=5):
-    """Compute productivity over current and past 4 years."""
-    return (df.pivot(index="scopus_id", columns="t", values="SJR")
-              .fillna(0).rolling(window, min_periods=1, axis=1).sum()
-              .reset_index().melt(id_vars="scopus_id", value_name="SJR"))
-
-
-def transform(df, value_name):
-    """Melt and explode DataFrame of neighbors."""
-    df = df.melt(id_vars="index", var_name="t", value_name=value_name)
-    df = df.dropna().set_index(["index", "t"])
-    df = explode(df, value_name, value_name)
-    df[value_name] = df[value_name].astype(int)
-    df["t"] = df["t"].astype("uint")
-    return df
+        year = int(basename(file)[:4])
+        links = [(int(u), int(v)) for u, v in G.edges()
+                 if u.isdigit() and v.isdigit()]
+        if not G.is_directed():
+            links.extend([(v, u) for u, v in links])
+        edges[year] = np.array(links, dtype="int64").reshape(-1, 2)
+    return edges
+
+
+def second_neighbor_productivity(A, q, ids):
+    """Compute the productivity of second neighbors, i.e. researchers at
+    distance two who are neither direct neighbors nor the researcher.
+
+    Returns Series of the summed productivity `q` of each researcher's
+    second neighbors, for researchers with at least one second neighbor.
+    """
+    B = (A @ A).sign()
+    B = B - B.multiply(A)
+    B.setdiag(0)
+    B.eliminate_zeros()
+    q2 = B @ q
+    rows = np.flatnonzero(np.diff(B.indptr))
+    return pd.Series(q2[rows], index=ids[rows])
 
 
 def main():
     # Read in
-    cols = ["scopus_id", "years", "sources", "coauthors"]
-    pubs = pd.read_csv(PUBLICATION_LIST, index_col=0, usecols=cols)
-    for c in pubs.columns:
-        pubs[c] = pubs[c].str.split("|")
+    wpubs = read_publications().rename(columns={"year": "t"})
+    eids = pd.Index(wpubs["eid"].unique())
+    wpubs["eid"] = eids.get_indexer(wpubs["eid"])
 
     # Weigh publications
     print(">>> Weighting publications...")
-    dfs = [explode(pubs, "years", "t"),
-           explode(pubs, "sources", "source").drop("scopus_id", axis=1),
-           explode(pubs, "coauthors", "authors").drop("scopus_id", axis=1)]
-    wpubs = pd.concat(dfs, axis=1)
-    wpubs["t"] = wpubs["t"].astype("uint")
     jif = read_jif().drop_duplicates(subset="source").drop("year", axis=1)
-    wpubs = wpubs.merge(jif, "left", on="source").drop("source", axis=1)
-
-    # Read neighbors
-    print(">>> Reading network files...")
-    auth_1st, auth_2nd = get_neighbors(glob(NETWORK_FOLDER + "*auth.gexf"))
-    com_1st, com_2nd = get_neighbors(glob(NETWORK_FOLDER + "*com.gexf"))
-
-    # Compute first neighbors' productivity (account for joint publications)
-    print(">>> Computing first neighbors' productivity...")
-    wpubs["authors"] = wpubs["authors"].str.split(";")
-    auth1 = compute_first_neigh_prod(auth_1st, wpubs)
-    auth1 = auth1.rename(columns={'SJR': 'qit1_a', 'index': 'scopus_id'})
-    auth1["scopus_id"] = auth1["scopus_id"].astype(int)
-    com1 = compute_first_neigh_prod(com_1st, wpubs)
-    com1 = com1.rename(columns={'SJR': 'qit1_c', 'index': 'scopus_id'})
-    com1["scopus_id"] = com1["scopus_id"].astype(int)
-
-    # Compute second neighbors' productivity
-    print(">>> Computing second neighbors' productivity...")
-    wpubs = wpubs.groupby(["scopus_id", "t"])["SJR"].sum().reset_index()
-    wpubs = cumulate_productivity(wpubs)
-    params = {"right": wpubs, "how": "left", "on": ["scopus_id", "t"]}
-    auth2 = (auth_2nd.merge(**params)
-                     .groupby(["scopus_id", "t"])["SJR"].sum()
-                     .reset_index()
-                     .rename(columns={"SJR": 'qit2_a'}))
-    com2 = (com_2nd.merge(**params)
-                   .groupby(["scopus_id", "t"])["SJR"].sum()
-                   .reset_index()
-                   .rename(columns={"SJR": 'qit2_c'}))
+    wpubs = wpubs.merge(jif, "left", on="source")
+    wpubs = wpubs[["scopus_id", "eid", "t", "SJR"]]
+
+    # Network files and researchers with publications
+    files = {label: {int(basename(f)[:4]): f
+                     for f in glob(f"{NETWORK_FOLDER}*{net}.gexf")}
+             for label, net in (("a", "auth"), ("c", "com"))}
+    ids = pd.Index(np.unique(wpubs["scopus_id"]))
+    net_years = [y for d in files.values() for y in d]
+    years = np.arange(min(wpubs["t"].min(), min(net_years) - 4),
+                      max(wpubs["t"].max(), max(net_years)) + 1)
+
+    # Productivity matrices
+    P = productivity_matrix(wpubs, ids, years)
+    Q = rolling_sum(P, 5)
+    coauthors = read_coauthors().rename(columns={"coauthor": "author"})
+    coauthors["eid"] = eids.get_indexer(coauthors["eid"])
+    coauthors = coauthors[coauthors["eid"] > -1]
+
+    # Compute neighbors' productivity year by year, reading each network
+    # once while it is in the window
+    print(">>> Computing neighbors' productivity...")
+    cols = [f"qit{k}_{label}" for label in files for k in (1, 2)]
+    edges = {label: {} for label in files}
+    out = []
+    header = True
+    for t in years:
+        for label, d in files.items():
+            window = [y for y in range(t, t+WINDOW) if y in d]
+            kept = {y: edges[label][y] for y in window if y in edges[label]}
+            kept.update(read_edges([d[y] for y in window if y not in kept]))
+            edges[label] = kept
+        df = compute_year(t, edges, P, Q, coauthors, wpubs, ids, years)
+        if df is None:
+            continue
+        if STREAM:
+            df = df.reindex(columns=cols).sort_index()
+            df.to_csv(TARGET_FILE, mode="w" if header else "a", header=header)
+            header = False
+        else:
+            out.append(df)
 
     # Write out
-    print(">>> Writing out...")
-    out = (auth1.merge(auth2, "outer", on=['scopus_id', 't'])
-                .merge(com1, "outer", on=['scopus_id', 't'])
-                .merge(com2, "outer", on=['scopus_id', 't'])
-                .sort_values(['scopus_id', 't']))
-    out.to_csv(TARGET_FILE, index=False)
+    if not STREAM:
+        print(">>> Writing out...")
+        out = pd.concat(out, sort=False).reindex(columns=cols).sort_index()
+        out.to_csv(TARGET_FILE)
 
 
 if __name__ == '__main__':
@@ -4,14 +4,13 @@
 informal collaboration.
 """
 
-from glob import glob
-
+import numpy as np
 import pandas as pd
 
-from _580_create_paper_sample import custom_pivot, read_centrality_file
+from _115_count_collaboration import read_collaboration_counts
+from _313_compute_author_metrics import rolling_sum, to_long, to_panel
+from _580_create_paper_sample import read_centralities
 
-COMMENTS_FILE = "./115_collaboration_counts/person.csv"
-CENTR_FOLDER = "./205_centralities/"
 METRICS_FILE = "./313_author_metrics/metrics.csv"
 GENDER_FILE = "./350_gender_estimates/genderize.csv"
 NETWORK_FILE = "./880_person_sample/network.csv"
@@ -22,10 +21,7 @@ EXP_CUTOFF = 10  # Diagnostics to detect suspiciously young nodes
 
 def main():
     # Read centrality
-    files = glob(CENTR_FOLDER + "yearly*.csv")
-    centr = pd.concat([read_centrality_file(f) for f in files], axis=0, sort=True)
-    centr = custom_pivot(centr, id_var='node', var_name='year',
-                         unstack_by='centrality')
+    centr = read_centralities()
     centr = centr.rename(columns={"node": "scopus_id"})
     centr["year"] = centr["year"].astype(int)
 
@@ -50,16 +46,19 @@ def main():
     netw = netw.merge(m_comb, 'left', on=['scopus_id', 'year'])
 
     # Merge with cumulated comments
-    comments = pd.read_csv(COMMENTS_FILE, low_memory=False)
-    c_cumul = (comments.set_index(['node', 'variable'])
-                       .fillna(0)
-                       .rolling(window=3, axis=1).sum()
-                       .drop(['1997', '1998'], axis=1)
-                       .reset_index())
-    c_cumul = custom_pivot(c_cumul, id_var='node', var_name='year',
-                           unstack_by='variable')
-    c_cumul = c_cumul.rename(columns={"node": "scopus_id"})
-    c_cumul["year"] = c_cumul["year"].astype(int)
+    comments = read_collaboration_counts()
+    nodes, years, present = to_panel(comments, "node", "year", "year")
+    present = ~np.isnan(present)
+    features = {}
+    for v in comments.columns.drop(["node", "year"]):
+        X = to_panel(comments, "node", "year", v)[2]
+        cumul = rolling_sum(np.nan_to_num(X), 3, min_periods=3)[:, 2:]
+        # Missing for persons active only in years without this variable
+        observed = ~np.isnan(X).all(axis=0)
+        cumul[~present[:, observed].any(axis=1)] = np.nan
+        features[v] = cumul
+    c_cumul = to_long(nodes, years[2:], features, ("scopus_id", "year"),
+                      dropna=True)
     netw = netw.merge(c_cumul, 'left', on=['scopus_id', 'year'])
 
     # Compute experience
@@ -90,9 +89,7 @@ def main():
     # Create paper file
     cols = ('node', 'year', 'num_paper', 'num_com_n', 'num_con_n',
             'num_sem_n', 'num_auth')
-    comments = comments[comments["variable"].isin(cols)]
-    comments = custom_pivot(comments, id_var='node', var_name='year',
-                            unstack_by='variable')
+    comments = comments[list(cols)].dropna(how="all", subset=list(cols[2:]))
     comments["num_auth"] = comments["num_auth"]-1
     comments["year"] = comments["year"].astype("int32")
     comments = comments.rename(columns={"node": "scopus_id"})
@@ -16,6 +16,7 @@ import networkx as nx
 import pandas as pd
 import seaborn as sns
 
+from _116_list_informal_pairs import read_pairs
 from _200_build_networks import write_stats
 
 config = ConfigParser()
@@ -26,7 +27,6 @@ sns.set(style=config["styles"]["style"], font=config["styles"]["font"],
         rc={"lines.linewidth": 0.5})
 mpl.rcParams['axes.unicode_minus'] = False
 
-PAIR_FILE = "./116_informal_collaboration_pairs/pairs.csv"
 NETWORKS_FOLDER = "./200_yearly_networks/"
 METRICS_FILE = "./313_author_metrics/metrics.csv"
 PERSONNETWORK_FILE = "./880_person_sample/network.csv"
@@ -147,9 +147,9 @@ def make_histogram(df, col='com_given', label="Number"):
 def make_jointkde():
     """Create a heatmap for experience of authors and commenters."""
     # Merge with year of first publication
-    df = pd.read_csv(PAIR_FILE, encoding="utf8")
-    df = df[df['commenter'].str.isdigit()]
-    df['commenter'] = df['commenter'].astype(int)
+    df = read_pairs()
+    df = df[df['author'].str.isdigit() & df['commenter'].str.isdigit()]
+    df[['author', 'commenter']] = df[['author', 'commenter']].astype(int)
     metrics = pd.read_csv(METRICS_FILE, usecols=["scopus_id", "year"], encoding="utf8")
     metrics = (metrics.drop_duplicates(subset='scopus_id')
                       .rename(columns={'year': 'first_pub_year'})
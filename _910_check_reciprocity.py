@@ -6,111 +6,161 @@ or at least one researcher that acknowledges one of the original authors
 on his papers.
 """
 
-from collections import defaultdict
 from glob import glob
-from os.path import basename, splitext
 
-import networkx as nx
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix
 
+from _115_count_collaboration import incidence_matrix
 from _116_list_informal_pairs import read_ack_file
 from _200_build_networks import write_stats
-from _313_compute_author_metrics import explode
+from _312_parse_author_data import read_affiliations
+from _770_compute_neighbor_metrics import adjacency, read_edges
 
 NETWORK_FOLDER = "./200_yearly_networks/"
-AFFILIATION_FILE = "./312_author_data/pub_list.csv"
 OUTPUT_FOLDER = "./990_output/"
 
-PLATFORMS = {"60016621", "60020337", "60007893"}
+LOOKBACK = None  # Years before publication whose networks are used (None: all)
 
 
-def count_coll_com(s):
-    """Count how many commenters are colleagues."""
-    auth = set([a for a in s["auth"] if a])
-    coms = [set(c.strip("-").split("-")) for c in s["coms"]
-            if c and c not in ("?", "nan")]
-    if not coms:
-        return None
-    return len([c for c in coms if len(c.intersection(auth))])
-
-
-def group_affiliations(group, acks, affiliations, year_correction=0):
-    """Aggregate affiliations of researchers (author or commenters) on
-    a paper level, possibly using past affiliations instead.
+def affiliation_matrix(persons, years, spells, n_affs):
+    """Return sparse binary matrix of the affiliations (integer-coded in
+    `spells`) of each listed researcher, and the position of each listing
+    in Series `persons` of lists of researchers.
     """
-    temp = explode(acks, group, "scopus_id").set_index("title")
-    temp = temp.join(acks[["year"]])
-    temp["year"] = temp["year"]-year_correction
-    affs = (temp.reset_index()
-                .merge(affiliations, "left", on=["scopus_id", "year"]))
-    affs["aff_ids"] = affs["aff_ids"].astype(str) + "|"
-    grouped = affs.groupby(["title", "year"])["aff_ids"].sum()
-    grouped.name = group
-    return grouped
-
-
-def read_affiliations(max_year=2011):
-    """Read and compile yearly affiliations of researchers, where missing
-    information are forward-filled.
+    lengths = persons.str.len().fillna(0).astype(int).values
+    position = np.repeat(np.arange(len(persons)), lengths)
+    queries = pd.DataFrame({
+        "scopus_id": [p for entry in persons.dropna() for p in entry],
+        "year": np.asarray(years)[position]})
+    affs = lookup_affiliations(spells, queries)
+    M = csr_matrix((np.ones(len(affs)), (affs.index.values, affs.values)),
+                   shape=(len(queries), n_affs))
+    return M.sign(), position
+
+
+def affiliation_spells(max_year=2011):
+    """Compile affiliation spells of researchers, where an affiliation
+    lasts from its observation until the researcher's next observation
+    (at most until `max_year`).
     """
-    cols = ["scopus_id", "years", "aff_ids"]
-    df = pd.read_csv(AFFILIATION_FILE, usecols=cols, index_col=0, encoding="utf8")
-    df = df.dropna(subset=["aff_ids"])
-    # Remove platform affiliations
-    for platform in PLATFORMS:
-        df["aff_ids"] = df["aff_ids"].str.replace(platform, "")
-    # Create long list
-    for col in df.columns:
-        df[col] = df[col].str.split("|")
-    years = explode(df, "years", "year").drop("scopus_id", axis=1)
-    affs = explode(df, "aff_ids")
-    out = pd.concat([affs, years], axis=1)
-    # Combine multiple affiliation information
-    out["aff_ids"] = out["aff_ids"].str.strip("-")
-    out = out[~(out["aff_ids"].isin(("?", "")))]
-    out = out.drop_duplicates(["scopus_id", "year", "aff_ids"])
-    out["aff_ids"] = out["aff_ids"] + "|"
-    out = out.groupby(["scopus_id", "year"])["aff_ids"].sum().reset_index()
-    out["aff_ids"] = (out["aff_ids"].str.strip("|")
-                                    .str.replace("|", "-")
-                                    .str.replace("--", "-"))
-    # Forward-fill missing years
-    out["year"] = out["year"].astype(int)
-    extension_range = range(out["year"].min(), max_year+1)
-    data = {"year": list(extension_range)*affs["scopus_id"].nunique(),
-            "scopus_id": sorted(list(affs["scopus_id"].unique())*len(extension_range))}
-    dummies = pd.DataFrame(data)
-    out = dummies.merge(out, "left", on=["year", "scopus_id"])
-    out["aff_ids"] = out["aff_ids"].fillna(method="ffill")
-    out["scopus_id"] = out["scopus_id"].astype(str)
-    return out.dropna()
-
-
-def realized_reciprocity(s, direction=('coms', 'auth'), G=None, mapping=None):
-    """Check whether any commenter either acknowledges any of the authors on
-    her work, or whether she is a co-author of any of the authors.
+    df = read_affiliations().dropna(subset=["aff_id"])
+    df = df[df["year"] <= max_year]
+    df = df.astype({"scopus_id": str, "year": int, "aff_id": "int64"})
+    df = df[["scopus_id", "year", "aff_id"]].drop_duplicates()
+    # Affiliations last until the next observation
+    obs = (df[["scopus_id", "year"]].drop_duplicates()
+                                    .sort_values(["scopus_id", "year"]))
+    following = obs.groupby("scopus_id")["year"].shift(-1)
+    obs["end"] = following.fillna(max_year+1).astype(int) - 1
+    df = df.merge(obs, on=["scopus_id", "year"])
+    df = df.rename(columns={"year": "start"})
+    # Merge consecutive spells
+    df = df.sort_values(["scopus_id", "aff_id", "start"])
+    previous = df.groupby(["scopus_id", "aff_id"])["end"].shift()
+    df["spell"] = (df["start"] != previous + 1).cumsum()
+    return (df.groupby("spell")
+              .agg(scopus_id=("scopus_id", "first"), aff_id=("aff_id", "first"),
+                   start=("start", "min"), end=("end", "max"))
+              .reset_index(drop=True))
+
+
+def count_colleagues(acks, spells, year_correction=0):
+    """Count for each paper the commenters sharing an affiliation with any
+    author, possibly using past affiliations instead; missing for papers
+    without commenters of known affiliation.
     """
-    status = False
-    for p in s[direction[0]]:
-        if G:
-            neighbors = G.neighbors(p)
-        else:
-            neighbors = mapping.get(p, [])
-        status = max(status, any(c in neighbors for c in s[direction[1]]))
-    return status
-
-
-def potential_reciprocity(s, G):
-    """For authors, check whether an acknowledged commenter is author and
-    has coauthors; for commenters, check whether she is author and has papers
-    without authors of the paper she is acknowledged on.
+    codes = pd.Index(spells["aff_id"].unique())
+    spells = spells.assign(aff_id=codes.get_indexer(spells["aff_id"]))
+    years = acks["year"].values - year_correction
+    A, auth_pos = affiliation_matrix(acks["auth"], years, spells, len(codes))
+    C, com_pos = affiliation_matrix(acks["coms"], years, spells, len(codes))
+    # Affiliations of all authors by paper
+    A = A.tocoo()
+    paper_affs = csr_matrix((A.data, (auth_pos[A.row], A.col)),
+                            shape=(len(acks), len(codes))).sign()
+    shared = C.multiply(paper_affs[com_pos]).getnnz(axis=1) > 0
+    known = C.getnnz(axis=1) > 0
+    out = pd.Series(np.bincount(com_pos, weights=shared, minlength=len(acks)),
+                    index=acks.index)
+    has_known = np.bincount(com_pos, weights=known, minlength=len(acks)) > 0
+    return out.where(has_known)
+
+
+def lookup_affiliations(spells, queries):
+    """Return Series of affiliation IDs valid in the researcher-years of
+    DataFrame `queries`, indexed by the index of `queries`.
     """
-    if isinstance(s, list):
-        return any(c in G.nodes() and len(list(G.neighbors(c))) > 0 for c in s)
-    else:
-        authors = set(s['auth'])
-        return any(c in G.nodes() and
-                   len(set(G.neighbors(c)) - authors) > 0 for c in s['coms'])
+    temp = (queries.rename_axis("query").reset_index()
+                   .merge(spells, "inner", on="scopus_id"))
+    valid = (temp["start"] <= temp["year"]) & (temp["year"] <= temp["end"])
+    return temp[valid].set_index("query")["aff_id"]
+
+
+def measure_reciprocity(P_auth, P_coms, A, R):
+    """Return dict of boolean arrays indicating realized and potential
+    reciprocity for papers given by paper-by-person matrices of authors
+    and commenters, coauthor adjacency A and author-by-commenter matrix R.
+
+    Realized reciprocity among coauthors means that any commenter is a
+    coauthor of any of the authors; among commenters that any commenter
+    acknowledges any of the authors on the commenter's own work.
+    Potentially, a commenter is an author with coauthors, and for
+    commenters also with coauthors other than the paper's authors.
+    """
+    out = {}
+    out["r_auth"] = P_coms.multiply(P_auth @ A).sum(axis=1).A1 > 0
+    out["r_auth_p"] = P_coms @ (A.getnnz(axis=1) > 0).astype(int) > 0
+    out["r_com"] = P_auth.multiply(P_coms @ R).sum(axis=1).A1 > 0
+    # Number of coauthors of each commenter that are not authors
+    coms = P_coms.tocoo()
+    shared = np.asarray((P_auth @ A)[coms.row, coms.col]).ravel()
+    others = A.getnnz(axis=1)[coms.col] - shared
+    out["r_com_p"] = np.bincount(coms.row, weights=others > 0,
+                                 minlength=P_coms.shape[0]) > 0
+    return out
+
+
+def reciprocity(acks, networks, lookback=LOOKBACK):
+    """Return DataFrame indicating realized and potential reciprocity for
+    each paper, given dict of dicts of yearly arrays of directed edges
+    among identified researchers by network type ("auth", "com").
+
+    With `lookback` set, papers are compared to the yearly networks of
+    the publication year and the `lookback` years before, and to the
+    acknowledgements in these networks; otherwise to the union of all
+    yearly coauthor networks and to all acknowledgements.
+    """
+    # Acknowledgements list Scopus IDs as strings
+    networks = {label: {y: e.astype(str) for y, e in d.items()}
+                for label, d in networks.items()}
+    persons = set().union(*acks["auth"], *acks["coms"])
+    for d in networks.values():
+        for edges in d.values():
+            persons.update(edges.ravel())
+    ids = pd.Index(sorted(persons))
+    P_auth = incidence_matrix(acks["auth"], ids)[1].sign()
+    P_coms = incidence_matrix(acks["coms"], ids)[1].sign()
+    auth = {y: adjacency(e, ids) for y, e in networks["auth"].items()}
+    if lookback is None:
+        A = sum(auth.values(), csr_matrix((len(ids), len(ids)))).sign()
+        R = (P_auth.T @ P_coms).sign()
+        return pd.DataFrame(measure_reciprocity(P_auth, P_coms, A, R),
+                            index=acks.index)
+    # Author-by-commenter matrices from directed commenter networks
+    com = {y: adjacency(e, ids).T for y, e in networks["com"].items()}
+    empty = csr_matrix((len(ids), len(ids)))
+    years = acks["year"].values
+    out = []
+    for year in np.unique(years):
+        mask = years == year
+        window = range(year-lookback, year+1)
+        A = sum((auth[y] for y in window if y in auth), empty).sign()
+        R = sum((com[y] for y in window if y in com), empty).sign()
+        res = measure_reciprocity(P_auth[mask], P_coms[mask], A, R)
+        out.append(pd.DataFrame(res, index=acks.index[mask]))
+    return pd.concat(out).reindex(acks.index)
 
 
 def split(entry, delim):
@@ -124,48 +174,20 @@ def split(entry, delim):
 def main():
     # Read acknowledgements and networks
     acks = read_ack_file()
-    G = defaultdict(lambda: nx.Graph())
-    for fname in glob(NETWORK_FOLDER + '*.gexf'):
-        net_type = splitext(basename(fname))[0][5:]
-        H = nx.read_gexf(fname).to_undirected()
-        G[net_type] = nx.compose(G[net_type], H)
-
-    # Dictionary mapping authors and their commenters
-    auth_com_map = {n: [] for n in G['auth'].nodes()}
-    for row in acks.itertuples(index=False):
-        for author in row.auth:
-            auth_com_map[author].extend(row.coms)
-
-    # Reciprocity among coauthors
-    acks['r_auth'] = acks[['auth', 'coms']].apply(
-        lambda s: realized_reciprocity(s, ('auth', 'coms'), G=G['auth']), axis=1)
-    acks['r_auth_p'] = acks['coms'].apply(
-        lambda s: potential_reciprocity(s, G['auth']))
-
-    # Reciprocity among commenters
-    acks['r_com'] = acks[['auth', 'coms']].apply(
-        lambda s: realized_reciprocity(s, mapping=auth_com_map), axis=1)
-    acks['r_com_p'] = acks[['auth', 'coms']].apply(
-        lambda s: potential_reciprocity(s, G['auth']), axis=1)
+    networks = {"auth": read_edges(glob(NETWORK_FOLDER + "*auth.gexf")),
+                "com": read_edges(glob(NETWORK_FOLDER + "*com.gexf"))}
+
+    # Reciprocity among coauthors and among commenters
+    acks = pd.concat([acks, reciprocity(acks, networks)], axis=1)
 
     # Read affiliation information
-    affs = read_affiliations()
+    spells = affiliation_spells()
 
     # Reciprocity among colleagues
-    acks = acks.set_index("title")
-    auth_aff = group_affiliations("auth", acks, affs, year_correction=1)
-    com_aff = group_affiliations("coms", acks, affs, year_correction=1)
-    both_aff = pd.concat([auth_aff, com_aff], axis=1).reset_index()
-    both_aff = both_aff.dropna(subset=["coms"])
-    both_aff["auth"] = both_aff["auth"].str.replace("-", "|")
-    for c in ("auth", "coms"):
-        both_aff[c] = both_aff[c].str.strip("|").str.strip("-").str.split("|")
-    both_aff["com_coll"] = both_aff.apply(count_coll_com, axis=1)
-    both_aff = both_aff.dropna(subset=["com_coll"])
+    acks["com_coll"] = count_colleagues(acks, spells, year_correction=1)
+    counts = acks["com_coll"].dropna()
     print(">>> Distribution of the number of commenters that are colleagues")
-    print(both_aff["com_coll"].value_counts()/both_aff.shape[0])
-    acks = acks.merge(both_aff.drop(["year", "auth", "coms"], axis=1),
-                      "left", on="title")
+    print(counts.value_counts()/counts.shape[0])
     acks["r_coll"] = acks["com_coll"].fillna(0) > 0
     acks["r_coll_p"] = acks["com_coll"].notnull()
 
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+import _005_create_bibliography as b
+from _005_create_bibliography import append_citations, citation_matrix,\
+    cumulative_citations, read_citations
+
+
+def make_records(eids, seed=0):
+    """Yearly citations from the publication year until the last year
+    in CITATION_YEARS, as returned by CitationOverview.
+    """
+    rng = np.random.RandomState(seed)
+    records = {}
+    for eid in eids:
+        pubyear = int(rng.randint(2000, 2011))
+        years = range(pubyear, b.CITATION_YEARS[1]+1)
+        records[eid] = (pubyear, {y: int(rng.poisson(3)) for y in years})
+    return records
+
+
+def use_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(b, "CITATION_FOLDER", f"{tmp_path}/")
+    monkeypatch.setattr(b, "CITATION_YEARS", (2000, 2010))
+
+
+def test_append_discards_interrupted_rows(tmp_path, monkeypatch):
+    use_store(tmp_path, monkeypatch)
+    first = make_records(["a", "b"])
+    append_citations(first)
+    with open(tmp_path / "counts.dat", "ab") as outf:
+        np.full(17, 99, dtype="int32").tofile(outf)
+    second = make_records(["c"], seed=1)
+    append_citations(second)
+    index, pubyears, M = read_citations()
+    assert list(index) == ["a", "b", "c"]
+    assert (tmp_path / "counts.dat").stat().st_size == M.size*M.itemsize
+    for row, (pubyear, cites) in enumerate({**first, **second}.values()):
+        assert pubyears[row] == pubyear
+        assert list(M[row, pubyear-2000:]) == list(cites.values())
+
+
+def test_citation_matrix_marks_years_not_covered(tmp_path, monkeypatch):
+    use_store(tmp_path, monkeypatch)
+    append_citations({"a": (2003, {2003: 1, 2004: 0, 1999: 5, 2011: 7})})
+    index, _, M = read_citations()
+    assert list(M[0]) == [-1]*3 + [1, 0] + [-1]*6
+    X = citation_matrix(["a", "unknown"])
+    assert np.isnan(X[0, :3]).all() and np.isnan(X[0, 5:]).all()
+    assert list(X[0, 3:5]) == [1, 0]
+    assert np.isnan(X[1]).all()
+
+
+def test_cumulative_citations_matches_cumsum(tmp_path, monkeypatch):
+    use_store(tmp_path, monkeypatch)
+    records = make_records([f"e{i}" for i in range(20)], seed=2)
+    append_citations(records)
+    lags = [-1, 0, 1, 3, 8]
+    eids = list(records) + ["unknown"]
+    found = cumulative_citations(eids, lags)
+    for row, eid in enumerate(eids):
+        if eid not in records:
+            assert np.isnan(found[row]).all()
+            continue
+        pubyear, cites = records[eid]
+        cumsum = pd.Series(np.cumsum(list(cites.values())),
+                           index=[y - pubyear for y in cites])
+        expected = cumsum.reindex(lags).values
+        np.testing.assert_array_equal(found[row], expected)
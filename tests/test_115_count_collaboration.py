@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import _115_count_collaboration as c
+
+ACKS = [
+    {"year": 2001, "journal": "JF",
+     "authors": [{"scopus_id": "1", "label": "A"},
+                 {"scopus_id": "2", "label": "B",
+                  "phd": [{"scopus_id": "9", "label": "P"}]}],
+     "com": [{"scopus_id": "3", "label": "C"}, {"label": "Jane Doe"}],
+     "dis": [{"scopus_id": "4", "label": "D"}], "sem": ["X", "Y"]},
+    {"year": 2001, "journal": "RFS",
+     "authors": [{"scopus_id": "3", "label": "C"}],
+     "com": [{"scopus_id": "1", "label": "A"}], "con": 2},
+    {"year": 2002, "journal": "JF",
+     "authors": [{"scopus_id": "1", "label": "A"}]},
+    {"year": 2002, "journal": "JFE",
+     "authors": [{"scopus_id": "2", "label": "B"},
+                 {"scopus_id": "4", "label": "D"}], "con": ["Z"]},
+]
+
+
+class Response:
+    def read(self):
+        return json.dumps({"data": ACKS}).encode("utf-8")
+
+
+def test_counts_by_person_year(tmp_path, monkeypatch):
+    monkeypatch.setattr(c, "urlopen", lambda url: Response())
+    monkeypatch.setattr(c, "PERSON_FILE", str(tmp_path / "person_year.csv"))
+    monkeypatch.setattr(c, "WIDE_CSV", False)
+    c.main()
+    found = c.read_collaboration_counts().set_index(["node", "year"])
+    # Paper 2 has neither commenters nor conferences nor seminars
+    assert ("1", 2002) not in found.index
+    assert list(found.index) == [("1", 2001), ("2", 2001), ("2", 2002),
+                                 ("3", 2001), ("4", 2001), ("4", 2002),
+                                 ("9", 2001), ("Jane Doe", 2001)]
+    # Author of paper 0 and commenter on paper 1
+    expected = pd.Series({
+        "num_auth": 2, "num_com": 4, "num_dis": 1, "num_con": 0,
+        "num_sem": 2, "num_paper": 1, "num_com_n": 2, "num_dis_n": 0.5,
+        "num_con_n": 0, "num_sem_n": 1, "com_given": 1, "dis_given": np.nan})
+    pd.testing.assert_series_equal(found.loc[("1", 2001)].sort_index(),
+                                   expected.sort_index(), check_names=False)
+    # Persons who only commented have no author counts
+    assert found.loc[("4", 2001)].dropna().to_dict() == {
+        "com_given": 1, "dis_given": 1}
+    assert found.loc[("9", 2001)].dropna().to_dict() == {"com_given": 1}
+    assert found.loc[("2", 2002), "num_con_n"] == 0.5
+
+
+def test_link_matrix_weights_by_number_of_authors():
+    papers = c.parse_acks(ACKS)
+    papers["coms"] = papers["com"] + papers["dis"] + papers["phd"]
+    ids, B = c.incidence_layers(papers, ("auth", "coms"))
+    assert list(ids) == ["1", "2", "3", "4", "9", "Jane Doe"]
+    weights = 1/papers["auth"].str.len().values
+    L = pd.DataFrame(c.link_matrix(B["coms"], B["auth"], weights).toarray(),
+                     index=ids, columns=ids)
+    assert L.loc[["3", "4", "9", "Jane Doe"], ["1", "2"]].eq(0.5).all().all()
+    assert L.loc["1", "3"] == 1
+    assert L.values.sum() == 5
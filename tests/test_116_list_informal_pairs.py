@@ -0,0 +1,40 @@
+from os.path import abspath, dirname
+
+import numpy as np
+import pandas as pd
+
+import _116_list_informal_pairs as p
+from _116_list_informal_pairs import list_pairs, read_pairs, write_pairs
+
+REPO = dirname(dirname(abspath(__file__)))
+
+
+def test_read_pairs_matches_csv(monkeypatch):
+    monkeypatch.chdir(REPO)
+    expected = pd.read_csv(p.TARGET_FILE, dtype={"author": str,
+                                                  "commenter": str})
+    found = read_pairs()
+    cols = ["author", "commenter", "year"]
+    expected = expected.sort_values(cols).reset_index(drop=True)
+    found = found.astype({"year": int}).sort_values(cols)
+    pd.testing.assert_frame_equal(found.reset_index(drop=True), expected)
+    subset = read_pairs(years=(2000, 2001))
+    assert len(subset) == expected["year"].between(2000, 2001).sum()
+    assert set(subset["year"]) == {2000, 2001}
+
+
+def test_pairs_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(p, "PAIR_FILE", str(tmp_path / "pairs.npz"))
+    acks = pd.DataFrame({"year": [2003, 2001, 2001, 2003],
+                         "auth": [["a", "b"], ["a"], ["a", "c"], []],
+                         "coms": [["x"], ["b", "x"], ["x"], ["y"]]})
+    ids, pairs = list_pairs(acks)
+    write_pairs(ids, pairs)
+    expected = pd.DataFrame({
+        "author": ["a", "a", "c", "a", "b"],
+        "commenter": ["b", "x", "x", "x", "x"],
+        "year": [2001, 2001, 2001, 2003, 2003]})
+    found = read_pairs()
+    pd.testing.assert_frame_equal(found, expected, check_dtype=False)
+    assert read_pairs(years=(2002, 2003))["year"].tolist() == [2003, 2003]
+    assert np.issubdtype(pairs.dtype, np.integer)
@@ -0,0 +1,67 @@
+from copy import deepcopy
+from json import dump
+
+from _115_count_collaboration import incidence_layers, parse_acks
+from _200_build_networks import build_networks, changed_years, make_network,\
+    snapshot
+from test_115_count_collaboration import ACKS
+
+
+def test_make_network_from_incidence():
+    papers = parse_acks(ACKS)
+    papers["coms"] = papers["com"] + papers["dis"] + papers["phd"]
+    ids, B = incidence_layers(papers, ("auth", "coms"))
+    journals = papers["journal"].values
+    num_auth = papers["auth"].str.len().values
+    A = make_network(B["auth"], B["auth"], ids, journals)
+    assert sorted(A.nodes()) == ["1", "2", "3", "4"]
+    assert sorted(A.edges(data=True)) == [
+        ("1", "2", {"weight": 1.0, "journal": "JF"}),
+        ("2", "4", {"weight": 1.0, "journal": "JFE"})]
+    C = make_network(B["coms"], B["auth"], ids, journals, 1/num_auth,
+                     directed=True)
+    assert C.is_directed() and C.number_of_edges() == 9
+    assert C.edges["1", "3"] == {"weight": 1.0, "journal": "RFS"}
+    for commenter in ("3", "4", "9", "Jane Doe"):
+        for author in ("1", "2"):
+            assert C.edges[commenter, author] == {"weight": 0.5,
+                                                  "journal": "JF"}
+
+
+def test_make_network_joins_journals_of_repeated_links():
+    papers = parse_acks(ACKS + [{"year": 2002, "journal": "RFS",
+                                 "authors": ACKS[0]["authors"]}])
+    ids, B = incidence_layers(papers, ("auth",))
+    A = make_network(B["auth"], B["auth"], ids, papers["journal"].values)
+    assert A.edges["1", "2"]["weight"] == 2
+    assert sorted(A.edges["1", "2"]["journal"].split(";")) == ["JF", "RFS"]
+
+
+def test_changed_years_after_one_edit(tmp_path):
+    fname = str(tmp_path / "snapshot.json")
+    acks = deepcopy(ACKS)
+    for i, item in enumerate(acks):
+        item["title"] = f"Paper {i}"
+    assert changed_years(acks, fname) is None
+    with open(fname, "w") as out:
+        dump(snapshot(acks), out)
+    assert changed_years(acks, fname) == set()
+    acks[2]["com"] = [{"scopus_id": "5", "label": "E"}]
+    assert changed_years(acks, fname) == {2002}
+    # Moving a paper affects its old and new year
+    acks[0]["year"] = 2003
+    assert changed_years(acks, fname) == {2001, 2002, 2003}
+
+
+def test_build_networks_rebuilds_affected_windows(tmp_path):
+    papers = parse_acks(ACKS)
+    stats = tmp_path / "stats"
+    stats.mkdir()
+    built = build_networks(papers, {}, str(tmp_path), f"{stats}/", span=2,
+                           max_year=2004, changed={2002})
+    assert built == {2002, 2003}
+    assert sorted(p.name for p in tmp_path.glob("*.gexf")) == [
+        "2002_auth.gexf", "2002_com.gexf", "2003_auth.gexf", "2003_com.gexf"]
+    built = build_networks(papers, {}, str(tmp_path), f"{stats}/", span=2,
+                           max_year=2004)
+    assert built == {2001, 2002, 2003}
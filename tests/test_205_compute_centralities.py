@@ -0,0 +1,75 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+import _205_compute_centralities as c
+from _205_compute_centralities import centrality_frame, clustering,\
+    distance_statistics, global_analysis, long_records,\
+    neighborhood_function, read_centrality_panel, write_centralities
+
+
+def test_distance_statistics_single_node():
+    G = nx.Graph()
+    G.add_node("a")
+    nf = neighborhood_function(G)
+    assert distance_statistics(nf) == (0.0, 0.0)
+    assert nx.average_shortest_path_length(G) == 0
+
+
+def test_neighborhood_function_matches_exact_distances():
+    G = nx.connected_watts_strogatz_graph(200, 4, 0.1, seed=1)
+    nf = neighborhood_function(G)
+    avg_path, _ = distance_statistics(nf)
+    assert np.isclose(avg_path, nx.average_shortest_path_length(G), rtol=0.02)
+    assert len(nf) - 1 == nx.diameter(G)
+    assert np.isclose(nf.iloc[-1], G.number_of_nodes()**2, rtol=0.02)
+    pd.testing.assert_series_equal(neighborhood_function(G, chunk=7), nf)
+
+
+def test_global_analysis_reports_exact_distances():
+    G = nx.connected_watts_strogatz_graph(100, 4, 0.1, seed=3)
+    exact = global_analysis(G, G)
+    approx = global_analysis(G, G, neighborhood_function(G))
+    assert np.isclose(exact["Avg. path length"],
+                      nx.average_shortest_path_length(G))
+    assert exact["Diameter"] == nx.diameter(G)
+    assert exact["Effective diameter"] <= exact["Diameter"]
+    assert np.isclose(approx["Effective diameter"],
+                      exact["Effective diameter"], rtol=0.05)
+
+
+def test_clustering_matches_networkx():
+    G = nx.relabel_nodes(nx.powerlaw_cluster_graph(100, 3, 0.5, seed=2), str)
+    rng = np.random.RandomState(2)
+    for u, v in G.edges():
+        G.edges[u, v]["weight"] = rng.randint(1, 5)
+    local, transitivity = clustering(G)
+    expected = pd.Series(nx.clustering(G))
+    assert np.allclose(local, expected.reindex(local.index))
+    assert np.isclose(transitivity, nx.transitivity(G))
+    local, _ = clustering(G, weight="weight")
+    expected = pd.Series(nx.clustering(G, weight="weight"))
+    assert np.allclose(local, expected.reindex(local.index))
+
+
+def test_centrality_panel_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(c, "TARGET_FOLDER", f"{tmp_path}/")
+    frames = [pd.DataFrame({"betweenness": [0.5, np.nan, 0.25],
+                            "degree": [2.0, 1.0, 3.0]}, index=["3", "1", "2"]),
+              pd.DataFrame({"betweenness": [0.1], "degree": [np.nan]},
+                           index=["4"])]
+    records = [long_records(df, year) for df, year in zip(frames, (2001, 2003))]
+    write_centralities(records, "auth")
+
+    expected = (pd.concat(records).rename(columns={"centrality": "measure"})
+                  .pivot_table(index=["node", "year"], columns="measure",
+                               values="value")
+                  .rename_axis(columns=None).reset_index())
+    found = centrality_frame("auth")
+    pd.testing.assert_frame_equal(found, expected, check_dtype=False)
+    nodes, years, views = read_centrality_panel("auth", ["degree"], (2002, 2003))
+    assert list(years) == [2003]
+    assert list(nodes) == ["1", "2", "3", "4"]
+    assert np.isnan(views["degree"]).all()
+    wide = pd.read_csv(tmp_path / "yearly_centr_auth.csv", dtype={"node": str})
+    assert wide.set_index(["node", "centrality"]).loc[("2", "degree"), "2001"] == 3
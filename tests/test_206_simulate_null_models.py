@@ -0,0 +1,18 @@
+import networkx as nx
+import numpy as np
+
+from _205_compute_centralities import edge_array
+from _206_simulate_null_models import rewire
+
+
+def test_rewire_preserves_degree_sequence():
+    G = nx.powerlaw_cluster_graph(150, 3, 0.3, seed=3)
+    nodes, edges = edge_array(G)
+    new = rewire(edges, len(nodes), swaps=5, seed=3)
+    # Same degrees, no self-loops, no multi-edges, but different edges
+    degrees = np.bincount(edges.ravel(), minlength=len(nodes))
+    assert (np.bincount(new.ravel(), minlength=len(nodes)) == degrees).all()
+    assert (new[:, 0] != new[:, 1]).all()
+    keys = {frozenset(e) for e in new.tolist()}
+    assert len(keys) == len(new)
+    assert keys != {frozenset(e) for e in edges.tolist()}
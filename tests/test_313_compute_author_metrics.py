@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from scholarmetrics import euclidean
+
+from _313_compute_author_metrics import segment_citations
+
+
+def compute_euclid(df):
+    """Yearly Euclidean index of cumulated citations via scholarmetrics."""
+    return df.dropna(how="all", axis=1).cumsum(axis=1).apply(euclidean)
+
+
+def nan_preserving_sum(df):
+    """Yearly sums of citations, missing if all values are missing."""
+    return df.dropna(how="all", axis=1).fillna(0).sum(axis=0)
+
+
+def make_citations(seed=0):
+    """Random EID-by-year citations with ragged missing prefixes and one
+    researcher without any information.
+    """
+    rng = np.random.RandomState(seed)
+    ids = rng.choice(["1", "2", "3", "4"], size=12)
+    ids[:2] = "5"
+    M = rng.poisson(2, size=(12, 8)).astype(float)
+    for i, first in enumerate(rng.randint(0, 8, size=12)):
+        M[i, :first] = np.nan
+    M[:2] = np.nan
+    return pd.DataFrame(M, index=pd.Index(ids, name="scopus_id"),
+                        columns=range(2000, 2008))
+
+
+def test_segment_citations_matches_groupby():
+    eid_cites = make_citations()
+    out = segment_citations(eid_cites).set_index(["scopus_id", "year"])
+    for sid, group in eid_cites.groupby(level=0):
+        euclid = compute_euclid(group)
+        cites = nan_preserving_sum(group)
+        for year in eid_cites.columns:
+            if year not in cites.index:
+                assert (sid, year) not in out.index
+                continue
+            row = out.loc[(sid, year)]
+            assert np.isclose(row["yearly_cites"], cites[year])
+            assert np.isclose(row["euclid"], euclid[year])
+    assert "5" not in out.index.get_level_values(0)
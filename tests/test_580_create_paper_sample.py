@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from _580_create_paper_sample import aggregate, match_titles,\
+    person_year_incidence
+
+
+def make_papers():
+    """Papers indexed by simple_title and year with lists of persons."""
+    index = pd.MultiIndex.from_tuples(
+        [("A", 2001), ("B", 2001), ("C", 2002), ("D", 2003)],
+        names=["simple_title", "year"])
+    return pd.DataFrame({"auth": [["1", "2"], ["2"], ["3", "1", "1"], []]},
+                        index=index)
+
+
+def test_aggregate_matches_join_groupby():
+    papers = make_papers()
+    data = pd.DataFrame({"scopus_id": ["1", "2", "1", "3", "4"],
+                         "year": [2001, 2001, 2002, 2002, 2002],
+                         "cites": [1.0, 2.0, 4.0, np.nan, 8.0],
+                         "pubs": [1, 1, 2, 3, 1]})
+    data["year"] = data["year"].astype("uint16")
+    found = aggregate(person_year_incidence(papers, "auth"), data, "auth")
+    temp = (papers["auth"].explode().dropna().rename("scopus_id")
+                          .reset_index())
+    temp["year"] = temp["year"].astype("uint16")
+    expected = (temp.set_index(["scopus_id", "year"])
+                    .join(data.set_index(["scopus_id", "year"]), how="left")
+                    .groupby("simple_title").sum()
+                    .add_prefix("auth_"))
+    pd.testing.assert_frame_equal(found, expected, check_dtype=False)
+
+
+def test_match_titles_compares_same_journal_and_close_years():
+    left = pd.DataFrame({"journal": ["JF", "JF", "RFS"],
+                         "year": [2001, 2005, 2001]},
+                        index=["ASSETPRICING", "BANKRUNS", "LIQUIDITY"])
+    right = pd.DataFrame({"journal": ["JF", "JF", "JF", "RFS", "RFS"],
+                          "year": [2002, 2001, 2005, 2001, 2001]},
+                         index=["ASSETPRICINGS", "ASSETS", "BANKRUN",
+                                "LIQUIDITYRISK", "ASSETPRICING"])
+    found = match_titles(left, right, n_candidates=10)
+    # Jaccard index of character trigrams, e.g. 10 of 11 for ASSETPRICINGS
+    expected = pd.DataFrame({
+        "simple_title": ["ASSETPRICING", "ASSETPRICING", "BANKRUNS",
+                         "LIQUIDITY"],
+        "candidate": ["ASSETPRICINGS", "ASSETS", "BANKRUN", "LIQUIDITYRISK"],
+        "similarity": [10/11, 3/11, 5/6, 7/11],
+        "rank": [1, 2, 1, 1]})
+    pd.testing.assert_frame_equal(found.reset_index(drop=True), expected,
+                                  check_dtype=False)
+    top = match_titles(left, right, n_candidates=1)
+    assert list(top["candidate"]) == ["ASSETPRICINGS", "BANKRUN",
+                                      "LIQUIDITYRISK"]
@@ -0,0 +1,78 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from _770_compute_neighbor_metrics import adjacency, compute_year,\
+    first_neighbor_productivity, second_neighbor_productivity
+
+
+def make_networks(seed=4):
+    """Two yearly networks as directed edge arrays (both directions)."""
+    out = []
+    for year in range(2):
+        G = nx.gnp_random_graph(40, 0.08, seed=seed+year)
+        edges = np.array(list(G.edges()), dtype="int64").reshape(-1, 2)
+        out.append((G, np.vstack([edges, edges[:, ::-1]])))
+    return out
+
+
+def test_first_neighbor_productivity_matches_loop():
+    networks = make_networks()
+    ids = pd.Index(range(40))
+    rng = np.random.RandomState(4)
+    p = rng.rand(40)
+    C = csr_matrix(rng.rand(40, 40)*(rng.rand(40, 40) < 0.05))
+    A = [adjacency(edges, ids) for _, edges in networks]
+    found = first_neighbor_productivity(A, p, C, ids)
+    expected = {}
+    for i in ids:
+        neighbors = set().union(*(G[i] for G, _ in networks))
+        if neighbors:
+            expected[i] = sum(p[j] - C[i, j] for j in neighbors)
+    expected = pd.Series(expected)
+    assert list(found.index) == list(expected.index)
+    assert np.allclose(found, expected)
+
+
+def test_second_neighbor_productivity_matches_loop():
+    G, edges = make_networks()[0]
+    ids = pd.Index(range(40))
+    q = np.random.RandomState(5).rand(40)
+    found = second_neighbor_productivity(adjacency(edges, ids), q, ids)
+    expected = {}
+    for i in ids:
+        second = set().union(*(G[j] for j in G[i])) - set(G[i]) - {i}
+        if second:
+            expected[i] = q[list(second)].sum()
+    expected = pd.Series(expected)
+    assert list(found.index) == list(expected.index)
+    assert np.allclose(found, expected)
+
+
+def test_compute_year_uses_window_of_networks():
+    networks = make_networks()
+    edges = {"a": {2001: networks[0][1], 2007: networks[1][1]}}
+    ids = pd.Index(range(0, 40, 2))
+    years = np.arange(2000, 2008)
+    rng = np.random.RandomState(6)
+    P = rng.rand(len(ids), len(years))
+    Q = rng.rand(len(ids), len(years))
+    wpubs = pd.DataFrame({"scopus_id": [0, 2], "eid": [0, 1],
+                          "t": [2001, 2001], "SJR": [1.0, 2.0]})
+    coauthors = pd.DataFrame({"eid": [0, 1], "author": [5, 3]})
+    assert compute_year(2000, {"a": {2007: edges["a"][2007]}}, P, Q,
+                        coauthors, wpubs, ids, years) is None
+    found = compute_year(2001, edges, P, Q, coauthors, wpubs, ids, years)
+    # Researchers without publications have no productivity
+    full = pd.Index(range(40))
+    p = pd.Series(P[:, 1], index=ids).reindex(full, fill_value=0).values
+    q = pd.Series(Q[:, 1], index=ids).reindex(full, fill_value=0).values
+    C = csr_matrix(([1.0, 2.0], ([5, 3], [0, 2])), shape=(40, 40))
+    A = adjacency(edges["a"][2001], full)
+    first = first_neighbor_productivity([A], p, C, full)
+    second = second_neighbor_productivity(A, q, full)
+    expected = pd.concat([first.rename("qit1_a"), second.rename("qit2_a")],
+                         axis=1)
+    found = found.reset_index(level="t", drop=True)
+    pd.testing.assert_frame_equal(found, expected, check_names=False)
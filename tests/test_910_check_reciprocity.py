@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+import _910_check_reciprocity as r
+from _910_check_reciprocity import affiliation_spells, count_colleagues,\
+    reciprocity
+
+
+def brute_force_reciprocity(acks, coauthor_edges, com_edges=None):
+    """Set-based reciprocity measures using the acknowledgements in the
+    commenter network edges `com_edges` or, if None, all acknowledgements.
+    """
+    coauthors = {}
+    for u, v in coauthor_edges:
+        coauthors.setdefault(str(u), set()).add(str(v))
+    acknowledged = {}
+    if com_edges is None:
+        for auth, coms in zip(acks["auth"], acks["coms"]):
+            for a in auth:
+                acknowledged.setdefault(a, set()).update(coms)
+    else:
+        for c, a in com_edges:
+            acknowledged.setdefault(str(a), set()).add(str(c))
+    out = {}
+    for idx, auth, coms in zip(acks.index, acks["auth"], acks["coms"]):
+        out[idx] = {
+            "r_auth": any(c in coauthors.get(a, set())
+                          for a in auth for c in coms),
+            "r_auth_p": any(coauthors.get(c) for c in coms),
+            "r_com": any(a in acknowledged.get(c, set())
+                         for c in coms for a in auth),
+            "r_com_p": any(coauthors.get(c, set()) - set(auth) for c in coms)}
+    return pd.DataFrame(out).T.astype(bool)
+
+
+def make_acks(n, seed=7):
+    rng = np.random.RandomState(seed)
+    people = [str(p) for p in range(30)]
+    return pd.DataFrame({
+        "auth": [list(rng.choice(people, rng.randint(1, 4), replace=False))
+                 for _ in range(n)],
+        "coms": [list(rng.choice(people, rng.randint(0, 5), replace=False))
+                 for _ in range(n)],
+        "year": rng.randint(2000, 2003, n)})
+
+
+def test_reciprocity_checks_every_commenter():
+    rng = np.random.RandomState(7)
+    acks = make_acks(60)
+    # Only the last of several commenters is a coauthor of the author
+    acks.loc[60] = [["0"], ["11", "12", "13"], 2001]
+    edges = rng.randint(0, 30, (40, 2))
+    edges = np.vstack([edges, [[0, 13]], [[30, 31]]])
+    both = np.vstack([edges, edges[:, ::-1]])
+    networks = {"auth": {2000: both[:50], 2001: both[50:]},
+                "com": {2000: np.empty((0, 2), dtype="int64")}}
+    found = reciprocity(acks, networks)
+    expected = brute_force_reciprocity(acks, both)
+    pd.testing.assert_frame_equal(found, expected, check_names=False)
+    assert found.loc[60, "r_auth"]
+
+
+def test_reciprocity_uses_networks_within_lookback():
+    rng = np.random.RandomState(8)
+    acks = make_acks(80, seed=8)
+    networks = {"auth": {}, "com": {}}
+    for year in range(1998, 2003):
+        edges = rng.randint(0, 30, (15, 2))
+        networks["auth"][year] = np.vstack([edges, edges[:, ::-1]])
+        networks["com"][year] = rng.randint(0, 30, (30, 2))
+    for lookback in (0, 2):
+        found = reciprocity(acks, networks, lookback=lookback)
+        for year, papers in acks.groupby("year"):
+            window = range(year-lookback, year+1)
+            auth = np.vstack([networks["auth"][y] for y in window])
+            com = np.vstack([networks["com"][y] for y in window])
+            expected = brute_force_reciprocity(papers, auth, com)
+            pd.testing.assert_frame_equal(found.loc[papers.index], expected,
+                                          check_names=False)
+
+
+def make_affiliations(seed=9):
+    rng = np.random.RandomState(seed)
+    n = 120
+    df = pd.DataFrame({"scopus_id": rng.randint(0, 10, n),
+                       "eid": [f"e{i}" for i in range(n)],
+                       "year": rng.randint(1995, 2014, n).astype("uint16"),
+                       "aff_id": pd.array(rng.randint(1, 5, n), "Int64")})
+    df.loc[rng.rand(n) < 0.1, "aff_id"] = pd.NA
+    return df
+
+
+def test_affiliation_spells_last_until_next_observation(monkeypatch):
+    affs = make_affiliations()
+    monkeypatch.setattr(r, "read_affiliations", lambda: affs)
+    spells = affiliation_spells(max_year=2011)
+    # Affiliations of the latest observation in or before each year
+    known = affs.dropna(subset=["aff_id"])
+    known = known[known["year"] <= 2011]
+    expected = set()
+    for sid, group in known.groupby("scopus_id"):
+        for year in range(group["year"].min(), 2012):
+            latest = group["year"][group["year"] <= year].max()
+            affs_then = group.loc[group["year"] == latest, "aff_id"]
+            expected.update((str(sid), aff, year) for aff in affs_then)
+    found = {(sid, aff, year)
+             for sid, aff, start, end in spells.itertuples(index=False)
+             for year in range(start, end+1)}
+    assert found == expected
+    # Spells of a researcher at the same affiliation neither overlap nor touch
+    spells = spells.sort_values(["scopus_id", "aff_id", "start"])
+    previous = spells.groupby(["scopus_id", "aff_id"])["end"].shift()
+    assert (spells["start"] > previous + 1)[previous.notnull()].all()
+    assert spells["end"].max() == 2011
+
+
+def test_count_colleagues_matches_sets(monkeypatch):
+    monkeypatch.setattr(r, "read_affiliations", make_affiliations)
+    spells = affiliation_spells(max_year=2011)
+    rng = np.random.RandomState(10)
+    people = [str(p) for p in range(10)] + ["x"]
+    acks = pd.DataFrame({
+        "auth": [list(rng.choice(people, rng.randint(1, 3), replace=False))
+                 for _ in range(50)],
+        "coms": [list(rng.choice(people, rng.randint(0, 4), replace=False))
+                 for _ in range(50)],
+        "year": rng.randint(1996, 2013, 50)})
+    found = count_colleagues(acks, spells, year_correction=1)
+
+    def affiliations(person, year):
+        valid = ((spells["scopus_id"] == person) & (spells["start"] <= year)
+                 & (year <= spells["end"]))
+        return set(spells.loc[valid, "aff_id"])
+
+    for idx, auth, coms, year in acks.itertuples():
+        auth_affs = set().union(*(affiliations(a, year-1) for a in auth))
+        com_affs = [affiliations(c, year-1) for c in coms]
+        known = [affs for affs in com_affs if affs]
+        if not known:
+            assert np.isnan(found[idx])
+        else:
+            assert found[idx] == sum(bool(affs & auth_affs) for affs in known)